@@ -1,12 +1,12 @@
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+from jose import jwt, JWTError, ExpiredSignatureError
 from passlib.context import CryptContext
 from app.config import JWT_SECRET, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app import crud
+from app.utils.principal_cache import Principal, principal_cache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
@@ -35,16 +35,44 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# -------------------------------------------------------------------
+# 🔐 Unified auth dependency (cached verified token → Principal)
+# -------------------------------------------------------------------
+def _load_principal(token: str) -> Principal:
+    """Verifies the JWT and builds its Principal (the only path touching the DB)."""
     credentials_exception = HTTPException(status_code=401, detail="Could not validate credentials")
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_email(db, email=email)
+    subject = payload.get("sub")
+    if subject is None:
+        raise credentials_exception
+    if payload.get("role") == "admin":
+        # Static admin login: no user row behind it
+        return Principal(subject, "admin", None, None, None, None, payload["exp"])
+    db = SessionLocal()
+    try:
+        user = crud.get_user_by_email(db, email=subject)
+    finally:
+        db.close()
     if user is None:
         raise credentials_exception
-    return user
+    return Principal(subject, "user", user.id, user.full_name, user.roll_no, user.branch, payload["exp"])
+
+
+def get_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Caller's Principal; cache hits skip signature verification and the user lookup."""
+    principal = principal_cache.get(token)
+    if principal is None:
+        principal = _load_principal(token)
+        principal_cache.put(token, principal)
+    return principal
+
+
+def require_admin(principal: Principal = Depends(get_principal)) -> Principal:
+    if principal.role != "admin":
+        raise HTTPException(status_code=403, detail="Access denied (not admin)")
+    return principal
@@ -2,9 +2,124 @@ import os
 
 # ✅ Store DB in backend folder (not inside app/)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_URL = f"sqlite:///{os.path.join(BASE_DIR, 'attendance.db')}"
+DB_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'attendance.db')}")
+
+# 🗄️ SQLite tuning (WAL lets kiosks read while one writer commits)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")        # NORMAL is durable enough under WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # wait for the write lock, don't fail
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))   # page cache per connection
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+# Take the write lock at BEGIN instead of on the first write (avoids SQLITE_BUSY
+# on read→write upgrades, at the cost of serialising every session)
+SQLITE_BEGIN_IMMEDIATE = os.getenv("SQLITE_BEGIN_IMMEDIATE", "0") == "1"
+
+# 🐘 Connection pool (PostgreSQL and other server databases)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "10"))
+DB_POOL_RECYCLE_S = int(os.getenv("DB_POOL_RECYCLE_S", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))   # PostgreSQL only, 0 = off
 
 JWT_SECRET = "supersecretkey"
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# 🔐 Verified token → principal cache (per process; user updates/deletes invalidate it)
+AUTH_CACHE_TTL_S = float(os.getenv("AUTH_CACHE_TTL_S", "60"))     # also bounds staleness across workers
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
 FACE_CONFIDENCE_THRESHOLD = 0.5
+
+# 🗂️ Face search index: "exact" (NumPy brute force) or "ivf" (approximate)
+FACE_INDEX_BACKEND = os.getenv("FACE_INDEX_BACKEND", "exact")
+FACE_INDEX_PATH = os.path.join(BASE_DIR, "face_index.npz")
+FACE_INDEX_NLIST = int(os.getenv("FACE_INDEX_NLIST", "0"))       # 0 = auto (~4 * sqrt(N))
+FACE_INDEX_NPROBE = int(os.getenv("FACE_INDEX_NPROBE", "8"))
+FACE_INDEX_MIN_SIZE = int(os.getenv("FACE_INDEX_MIN_SIZE", "5000"))  # exact search below this
+
+# 📦 Cross-request embedding micro-batching
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "1") == "1"
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "15"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "16"))
+EMBED_TIMEOUT_S = float(os.getenv("EMBED_TIMEOUT_S", "30"))
+
+# ⚙️ Worker pool for CPU-heavy stages (liveness / OCR) with bounded admission
+WORKER_POOL_PROCESSES = int(os.getenv("WORKER_POOL_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+STAGE_QUEUE_LIMITS = {
+    "liveness": int(os.getenv("LIVENESS_QUEUE_LIMIT", "32")),
+    "embedding": int(os.getenv("EMBEDDING_QUEUE_LIMIT", "64")),
+    "ocr": int(os.getenv("OCR_QUEUE_LIMIT", "16")),
+}
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "2"))
+
+# 🔤 Tesseract OCR: "auto" (tesserocr if installed), "tesserocr" or "pytesseract"
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+TESSERACT_CMD = os.getenv("TESSERACT_CMD")        # pytesseract only; default: tesseract on PATH
+TESSDATA_PREFIX = os.getenv("TESSDATA_PREFIX")    # tesserocr only; default: compiled-in tessdata
+OCR_ENGINES_PER_PROCESS = int(os.getenv("OCR_ENGINES_PER_PROCESS", "1"))
+OCR_MAX_LINES = int(os.getenv("OCR_MAX_LINES", "8"))            # text lines stitched into the one OCR call per card
+OCR_DETECT_WIDTH = int(os.getenv("OCR_DETECT_WIDTH", "800"))    # card width used for line detection
+
+# ♻️ Result cache for resent images (card OCR text, face embeddings); exact-image keys
+PHASH_CACHE_ENABLED = os.getenv("PHASH_CACHE_ENABLED", "1") == "1"
+PHASH_CACHE_SIZE = int(os.getenv("PHASH_CACHE_SIZE", "512"))      # entries per cache (LRU)
+PHASH_CACHE_TTL_S = float(os.getenv("PHASH_CACHE_TTL_S", "300"))
+
+# 📤 Binary image uploads
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))     # per image
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(16 * 1024 * 1024)))  # whole request
+MAX_IMAGE_SIDE = int(os.getenv("MAX_IMAGE_SIDE", "1280"))                      # early downscale
+
+# 📡 WebSocket streaming liveness
+WS_MIN_FRAMES = int(os.getenv("WS_MIN_FRAMES", "3"))     # face frames needed before deciding
+WS_MAX_FRAMES = int(os.getenv("WS_MAX_FRAMES", "30"))    # give up after this many frames
+WS_FRAME_MAX_SIDE = int(os.getenv("WS_FRAME_MAX_SIDE", "480"))
+
+# 🕒 Local timezone for attendance days (default IST, UTC+5:30)
+LOCAL_UTC_OFFSET_MINUTES = int(os.getenv("LOCAL_UTC_OFFSET_MINUTES", "330"))
+# False (default): cache misses are confirmed with an indexed DB query, so marks
+# written by other workers or kiosk syncs are seen. True: the in-memory set is the
+# source of truth; only safe with a single API process.
+ATTENDANCE_CACHE_AUTHORITATIVE = os.getenv("ATTENDANCE_CACHE_AUTHORITATIVE", "0") == "1"
+
+# 🧾 Audit log: "async" (queued, bulk-inserted by a background thread) or
+# "sync" (one commit per event, in the caller's session — tests / scripts)
+AUDIT_LOG_MODE = os.getenv("AUDIT_LOG_MODE", "async")
+AUDIT_LOG_BATCH = int(os.getenv("AUDIT_LOG_BATCH", "200"))           # rows per bulk insert
+AUDIT_LOG_FLUSH_MS = float(os.getenv("AUDIT_LOG_FLUSH_MS", "500"))   # max age of a queued event
+AUDIT_LOG_BUFFER = int(os.getenv("AUDIT_LOG_BUFFER", "10000"))       # queued events before callers write inline
+
+# 🔄 Offline kiosk sync: signed bulk ingest (POST /attendance/sync)
+# KIOSK_SECRETS="kiosk-lib:secret1,kiosk-lab2:secret2" (HMAC-SHA256 key per kiosk)
+KIOSK_SECRETS = dict(
+    pair.strip().split(":", 1) for pair in os.getenv("KIOSK_SECRETS", "").split(",") if ":" in pair
+)
+SYNC_MAX_BATCH = int(os.getenv("SYNC_MAX_BATCH", "5000"))               # events per request
+SYNC_MAX_EVENT_AGE_DAYS = int(os.getenv("SYNC_MAX_EVENT_AGE_DAYS", "7"))  # older buffered events are rejected
+SYNC_MAX_CLOCK_SKEW_S = int(os.getenv("SYNC_MAX_CLOCK_SKEW_S", "300"))    # tolerated kiosk clock drift into the future
+
+# 📱 QR attendance sessions: "memory" (one API process) or "db" (shared table in
+# DATABASE_URL, needed when uvicorn runs several workers)
+QR_SESSION_STORE = os.getenv("QR_SESSION_STORE", "memory")
+QR_SESSION_TTL_S = int(os.getenv("QR_SESSION_TTL_S", "300"))
+QR_SWEEP_INTERVAL_S = float(os.getenv("QR_SWEEP_INTERVAL_S", "60"))    # background purge of expired entries
+QR_MAX_SESSIONS = int(os.getenv("QR_MAX_SESSIONS", "10000"))           # memory store caps (oldest evicted)
+QR_MAX_DEVICE_USES = int(os.getenv("QR_MAX_DEVICE_USES", "200000"))
+
+# 🔏 QR tokens: HMAC-signed, verified without server state
+QR_TOKEN_SECRET = os.getenv("QR_TOKEN_SECRET", "vedika_qr_secret")
+QR_IMAGE_CACHE_SIZE = int(os.getenv("QR_IMAGE_CACHE_SIZE", "256"))   # rendered PNG/SVG kept in memory
+QR_WRITE_FILES = os.getenv("QR_WRITE_FILES", "0") == "1"             # also save PNGs (removed after expiry)
+QR_FILES_DIR = os.getenv("QR_FILES_DIR", os.path.join(BASE_DIR, "app", "routes", "generated_qr"))
+
+# 🔁 Rotating QR sessions (new token every QR_ROTATE_S, pushed over SSE)
+QR_ROTATE_S = int(os.getenv("QR_ROTATE_S", "10"))
+QR_ROTATE_WINDOW = int(os.getenv("QR_ROTATE_WINDOW", "1"))          # previous epochs still accepted
+QR_ROTATING_SESSION_S = int(os.getenv("QR_ROTATING_SESSION_S", "3600"))  # lifetime of a rotating session
+
+# 📤 Admin exports: rows fetched / encoded per chunk
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))
+
+# 🔎 ID-card OCR matching (see utils/text_index.py)
+ID_ROLL_FUZZY_MIN = float(os.getenv("ID_ROLL_FUZZY_MIN", "0.8"))   # SequenceMatcher ratio vs a roll token
+ID_NAME_MATCH_MIN = float(os.getenv("ID_NAME_MATCH_MIN", "0.6"))   # share of name trigrams found in the text
@@ -1,8 +1,17 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_, func
 from sqlalchemy.orm import Session
 from app import models
 from app.auth import get_password_hash
-import pickle
-from datetime import datetime, timedelta, timezone  # ✅ added
+import numpy as np
+from app.utils.embedding_codec import (
+    encode_embedding, decode_embedding, decode_many, is_binary_embedding, embedding_pipeline, CROP_PIPELINE,
+)
+from app.utils.time_utils import now_local, day_bounds
+from app.utils.attendance_cache import attendance_cache
+from app.utils import attendance_summary
+from app.utils.audit_log import audit_log
 
 # 🧍 Create New User
 def create_user(db: Session, full_name: str, email: str, password: str):
@@ -20,20 +29,61 @@ def create_user(db: Session, full_name: str, email: str, password: str):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+def _query_encodings(db: Session):
+    return (
+        db.query(models.User.id, models.User.full_name, models.User.branch, models.User.face_encoding)
+        .filter(models.User.face_encoding.isnot(None))
+        .all()
+    )
+
 # 🧠 Get All Face Encodings (for recognition)
 def get_all_user_encodings(db: Session):
-    users = db.query(models.User).all()
-    data = []
-    for u in users:
-        if u.face_encoding:
-            data.append((u.id, u.full_name, pickle.loads(u.face_encoding)))
-    return data
-
-# 💾 Save User’s Face Encoding
+    return [(uid, name, decode_embedding(blob)) for uid, name, _, blob in _query_encodings(db)]
+
+# 🧠 Bulk-load all Face Encodings as one matrix (gallery cold start / refresh)
+def load_encoding_matrix(db: Session):
+    """Returns (user_ids, names, matrix, branches) using one query and one np.frombuffer."""
+    rows = _query_encodings(db)
+    by_size = {}
+    legacy = []
+    for row in rows:
+        if is_binary_embedding(row[3]):
+            by_size.setdefault(len(row[3]), []).append(row)
+        else:
+            legacy.append(row)
+
+    if not by_size and not legacy:
+        return np.empty(0, dtype=np.int64), [], np.empty((0, 0), dtype=np.float32), []
+
+    # Decode the dominant embedding size in one shot; legacy pickles one by one
+    group = max(by_size.values(), key=len) if by_size else []
+    matrix = decode_many([row[3] for row in group]) if group else None
+    legacy_vecs = [(uid, name, branch, decode_embedding(blob)) for uid, name, branch, blob in legacy]
+    dim = matrix.shape[1] if matrix is not None else len(legacy_vecs[0][3])
+    legacy_vecs = [row for row in legacy_vecs if len(row[3]) == dim]
+
+    skipped = len(rows) - len(group) - len(legacy_vecs)
+    if skipped:
+        print(f"⚠️ Skipped {skipped} face encodings with a different embedding size")
+    stale = sum(1 for row in rows if embedding_pipeline(row[3]) != CROP_PIPELINE)
+    if stale:
+        print(f"⚠️ {stale} face encodings come from an older face crop and match poorly; "
+              "re-enroll them (python migrate_embeddings.py --list-stale)")
+
+    parts = [matrix] if matrix is not None else []
+    if legacy_vecs:
+        parts.append(np.stack([row[3] for row in legacy_vecs]))
+    ordered = list(group) + legacy_vecs
+    user_ids = np.array([r[0] for r in ordered], dtype=np.int64)
+    names = [r[1] for r in ordered]
+    branches = [r[2] for r in ordered]
+    return user_ids, names, np.concatenate(parts).astype(np.float32, copy=False), branches
+
+# 💾 Save User’s Face Encoding (tagged little-endian float32 bytes)
 def save_face_encoding(db: Session, user_id: int, encoding):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if user:
-        user.face_encoding = pickle.dumps(encoding)
+        user.face_encoding = encode_embedding(encoding)
         db.commit()
 
 # 💾 Save Extracted ID OCR Text
@@ -43,11 +93,9 @@ def save_id_ocr(db: Session, user_id: int, text: str):
         user.id_ocr_text = text
         db.commit()
 
-# 🧾 ✅ Create Attendance Entry (with real IST timestamp)
+# 🧾 ✅ Create Attendance Entry (with real local/IST timestamp)
 def create_attendance(db: Session, user_id, status, confidence):
-    # Set Indian Standard Time (UTC +5:30)
-    IST = timezone(timedelta(hours=5, minutes=30))
-    current_time_ist = datetime.now(IST)
+    current_time_ist = now_local()
 
     att = models.Attendance(
         user_id=user_id,
@@ -56,30 +104,188 @@ def create_attendance(db: Session, user_id, status, confidence):
         timestamp=current_time_ist  # ✅ saves true current IST
     )
     db.add(att)
+    attendance_summary.apply_insert(db, [(user_id, status, current_time_ist)])
     db.commit()
     db.refresh(att)
+    attendance_cache.mark(user_id, current_time_ist)
     return att
 
+# 🧾 Create many Attendance Entries in one transaction (group photos)
+def create_attendance_bulk(db: Session, entries):
+    """`entries` is a list of (user_id, status, confidence); one commit for all rows."""
+    current_time_ist = now_local()
+
+    rows = [
+        models.Attendance(user_id=user_id, status=status, confidence=confidence, timestamp=current_time_ist)
+        for user_id, status, confidence in entries
+    ]
+    db.add_all(rows)
+    attendance_summary.apply_insert(db, [(user_id, status, current_time_ist) for user_id, status, _ in entries])
+    db.commit()
+    for user_id, _, _ in entries:
+        attendance_cache.mark(user_id, current_time_ist)
+    return rows
+
+# 🗑️ Delete one Attendance record (summaries updated in the same transaction)
+def delete_attendance(db: Session, record):
+    user_id = record.user_id
+    attendance_summary.apply_delete(db, [(user_id, record.status, record.timestamp)])
+    db.delete(record)
+    db.commit()
+    attendance_cache.unmark(db, user_id)
+
+# 🗑️ Delete a User with all their attendance
+def delete_user(db: Session, user):
+    rows = db.query(models.Attendance.user_id, models.Attendance.status, models.Attendance.timestamp).filter(
+        models.Attendance.user_id == user.id
+    ).all()
+    attendance_summary.apply_delete(db, rows)
+    db.delete(user)
+    db.commit()
+    attendance_cache.unmark(db, user.id)
+
 # 🧮 Log System Events (like enrollments, attendance)
+# Queued and bulk-written off the request path (AUDIT_LOG_MODE=sync: written here)
 def log_action(db: Session, action, detail):
-    log = models.AuditLog(action=action, detail=detail)
-    db.add(log)
-    db.commit()
+    audit_log.log(action, detail, db)
 
 # 🪪 ✅ Get All Registered Users (for OCR-based ID Attendance)
 def get_all_users(db: Session):
     return db.query(models.User).all()
 
-from datetime import datetime, date
-from app import models
+def get_user(db, user_id):
+    return db.query(models.User).filter(models.User.id == user_id).first()
 
 def get_user_by_roll(db, roll_no):
     return db.query(models.User).filter(models.User.roll_no == roll_no).first()
 
+def get_user_ids_marked_today(db, user_ids):
+    """Which of `user_ids` already have attendance today (one query)."""
+    if not user_ids:
+        return set()
+    return attendance_cache.marked_among(db, user_ids)
+
 def get_attendance_today(db, user_id):
-    today = date.today()
+    start, end = day_bounds()
     return db.query(models.Attendance).filter(
         models.Attendance.user_id == user_id,
-        models.Attendance.timestamp >= datetime.combine(today, datetime.min.time()),
-        models.Attendance.timestamp <= datetime.combine(today, datetime.max.time())
+        models.Attendance.timestamp >= start,
+        models.Attendance.timestamp < end
     ).first()
+
+def is_attendance_marked_today(db, user_id):
+    """Once-per-day check served from the in-memory cache"""
+    return attendance_cache.is_marked(db, user_id)
+
+
+# -------------------------------------------------------------------
+# 📋 Admin attendance listing (keyset pagination + filters)
+# -------------------------------------------------------------------
+def encode_attendance_cursor(att):
+    """Opaque cursor pointing just after `att` in (timestamp desc, id desc) order."""
+    raw = f"{att.timestamp.isoformat()}|{att.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_attendance_cursor(cursor):
+    """(timestamp, id) from a cursor; raises ValueError when it is malformed."""
+    try:
+        ts, att_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(att_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def attendance_filters(date_from=None, date_to=None, branch=None, roll_no=None, status=None, q=None):
+    """WHERE clauses shared by the admin listing and exports (dates are local days, inclusive)."""
+    clauses = []
+    if date_from:
+        clauses.append(models.Attendance.timestamp >= day_bounds(date_from)[0])
+    if date_to:
+        clauses.append(models.Attendance.timestamp < day_bounds(date_to)[1])
+    if branch:
+        clauses.append(models.User.branch == branch)
+    if roll_no:
+        clauses.append(models.User.roll_no == roll_no)
+    if status:
+        clauses.append(models.Attendance.status == status)
+    if q:
+        # Free-text box of the dashboard: roll-number prefix or part of the name
+        clauses.append(or_(models.User.roll_no.like(f"{q}%"), models.User.full_name.ilike(f"%{q}%")))
+    return clauses
+
+def get_attendance_page(db: Session, limit=50, cursor=None, include_total=False, **filters):
+    """One page of attendance joined with users, newest first.
+
+    Returns (rows, next_cursor, total); total is only counted when asked for.
+    """
+    clauses = attendance_filters(**filters)
+    query = (
+        db.query(models.Attendance, models.User)
+        .join(models.User, models.Attendance.user_id == models.User.id, isouter=True)
+        .filter(*clauses)
+    )
+
+    total = None
+    if include_total:
+        count = db.query(func.count(models.Attendance.id))
+        if any(filters.get(k) for k in ("branch", "roll_no", "q")):
+            count = count.join(models.User, models.Attendance.user_id == models.User.id)
+        # Date / status filters alone are answered from the attendance indexes
+        total = count.filter(*clauses).scalar()
+
+    if cursor:
+        ts, att_id = decode_attendance_cursor(cursor)
+        query = query.filter(or_(
+            models.Attendance.timestamp < ts,
+            and_(models.Attendance.timestamp == ts, models.Attendance.id < att_id),
+        ))
+    rows = (
+        query.order_by(models.Attendance.timestamp.desc(), models.Attendance.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_attendance_cursor(rows[-1][0])
+    return rows, next_cursor, total
+
+EXPORT_COLUMNS = ["ID", "Name", "Roll No", "Branch", "Status", "Confidence (%)", "Timestamp"]
+
+def iter_attendance_export(db: Session, chunk_size=1000, **filters):
+    """Yields export rows in chunks of `chunk_size` tuples (same order as EXPORT_COLUMNS).
+
+    Plain columns instead of ORM objects, fetched `chunk_size` at a time
+    from a streaming cursor, so memory stays flat however long the history.
+    """
+    query = (
+        db.query(
+            models.Attendance.id,
+            models.User.full_name,
+            models.User.roll_no,
+            models.User.branch,
+            models.Attendance.status,
+            models.Attendance.confidence,
+            models.Attendance.timestamp,
+        )
+        .join(models.User, models.Attendance.user_id == models.User.id, isouter=True)
+        .filter(*attendance_filters(**filters))
+        .order_by(models.Attendance.timestamp, models.Attendance.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    chunk = []
+    for att_id, name, roll_no, branch, status, confidence, timestamp in query:
+        chunk.append((
+            att_id,
+            name if name is not None else "Unknown",
+            roll_no if roll_no is not None else "—",
+            branch if branch is not None else "—",
+            status.replace("_", " ") if status else "",
+            round(confidence * 100, 2) if confidence else 0,
+            timestamp,
+        ))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
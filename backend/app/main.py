@@ -1,9 +1,19 @@
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.database import Base, engine
+from app.database import Base, engine, SessionLocal, describe_engine
 from app import models
+from app.utils.face_gallery import gallery
+from app.utils.text_index import user_text_index
+from app.utils import worker_pool
+from app.utils.attendance_cache import attendance_cache
+from app.utils import attendance_summary
+from app.utils.audit_log import audit_log
+from app.utils.qr_utils import purge_expired_qr_files
+from app.config import MAX_REQUEST_BYTES
+from app.utils.upload_utils import RequestSizeLimitMiddleware
 from app.routes import auth_routes, user_routes, attendance_routes, qr_routes, admin_routes
 
 app = FastAPI(title="Face + ID Attendance System")
@@ -17,8 +27,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ Reject oversized uploads while the body streams in (declared or chunked)
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
+
 # ✅ Create DB tables
 Base.metadata.create_all(bind=engine)
+print(f"🗄️ Database: {describe_engine(engine)}")
+
+# ✅ create_all skips existing tables, so add newer indexes to old databases too
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+# ✅ Build the in-memory face gallery and "marked today" cache once at startup
+@app.on_event("startup")
+def warm_caches():
+    db = SessionLocal()
+    try:
+        gallery.load_from_db(db)
+        user_text_index.load_from_db(db)
+        attendance_cache.warm(db)
+        attendance_summary.ensure_built(db)
+    finally:
+        db.close()
+
+# ✅ QR images left on disk by earlier runs (only written with QR_WRITE_FILES=1)
+@app.on_event("startup")
+def purge_stale_qr_images():
+    purge_expired_qr_files()
+
+@app.on_event("shutdown")
+def stop_worker_pool():
+    worker_pool.shutdown()
+
+@app.on_event("shutdown")
+def flush_audit_log():
+    audit_log.close()
+
+# ✅ Fast 503 when a heavy stage (liveness / embedding / OCR) is saturated
+@app.exception_handler(worker_pool.StageBusyError)
+async def stage_busy_handler(request: Request, exc: worker_pool.StageBusyError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy ({exc.stage}), please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # ✅ Include route files
 app.include_router(auth_routes.router)
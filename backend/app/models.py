@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, LargeBinary, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Text, Float, LargeBinary, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.database import Base
 from sqlalchemy.orm import relationship
@@ -9,7 +9,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     full_name = Column(String(255), nullable=False)
     roll_no = Column(String(50), nullable=False, unique=True, index=True)
-    branch = Column(String(100), nullable=False)
+    branch = Column(String(100), nullable=False, index=True)
     face_encoding = Column(LargeBinary, nullable=True)
     id_ocr_text = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -28,6 +28,13 @@ class Attendance(Base):
 
     user = relationship("User", back_populates="attendance")
 
+    # Once-per-day lookups: WHERE user_id = ? AND timestamp in [day start, day end)
+    # Admin listing: ORDER BY timestamp DESC, id DESC with a (timestamp, id) cursor
+    __table_args__ = (
+        Index("ix_attendance_user_timestamp", "user_id", "timestamp"),
+        Index("ix_attendance_timestamp_id", "timestamp", "id"),
+    )
+
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
@@ -36,3 +43,70 @@ class AuditLog(Base):
     action = Column(String(255))
     detail = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SyncReceipt(Base):
+    """Outcome of every synced kiosk event, keyed by its idempotency key."""
+    __tablename__ = "sync_receipts"
+
+    kiosk_id = Column(String(64), primary_key=True)
+    event_id = Column(String(128), primary_key=True)
+    result = Column(String(32), nullable=False)
+    attendance_id = Column(Integer, ForeignKey("attendance.id", ondelete="SET NULL"), nullable=True)
+    user_id = Column(Integer, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class QRSession(Base):
+    """Active QR attendance session (shared QR session store)."""
+    __tablename__ = "qr_sessions"
+
+    session_id = Column(String(64), primary_key=True)
+    payload = Column(Text, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)   # epoch seconds
+
+
+class QRDeviceUse(Base):
+    """One row per device that scanned a QR session (replay protection)."""
+    __tablename__ = "qr_device_uses"
+
+    session_id = Column(String(64), primary_key=True)
+    device = Column(String(128), primary_key=True)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+# -------------------------------------------------------------------
+# 📊 Summary tables (maintained by utils/attendance_summary.py)
+# -------------------------------------------------------------------
+class AttendanceDailySummary(Base):
+    """Attendance records per local day, branch and status (method)."""
+    __tablename__ = "attendance_daily_summary"
+
+    day = Column(Date, primary_key=True)
+    branch = Column(String(100), primary_key=True)
+    status = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class StudentAttendanceDay(Base):
+    """One row per student and local day with attendance."""
+    __tablename__ = "student_attendance_days"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    records = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_student_attendance_days_day_user", "day", "user_id"),
+    )
+
+
+class StudentAttendanceTotal(Base):
+    """Running per-student totals."""
+    __tablename__ = "student_attendance_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    days_present = Column(Integer, nullable=False, default=0)
+    records = Column(Integer, nullable=False, default=0)
+    first_day = Column(Date)
+    last_day = Column(Date)
@@ -1,31 +1,49 @@
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from app import models
-from app.auth import get_db
+from app import crud, models
+from app.auth import get_db, require_admin
+from app.database import SessionLocal
 from fastapi.responses import StreamingResponse
-import csv, io
-from fastapi import Depends, HTTPException, Header
-import jwt
-from app.config import JWT_SECRET, JWT_ALGORITHM
+from app.utils.export_utils import csv_chunks, columnar_chunks
+from fastapi import Depends, HTTPException
+from app.config import EXPORT_CHUNK_ROWS
+from app.utils.metrics import metrics
+from app.utils import attendance_summary
+from app.utils.audit_log import audit_log
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 # -------------------- EXISTING CODE (UNCHANGED) --------------------
 
-# ✅ Fetch all attendance records with user info (for dashboard)
+# ✅ Attendance records with user info (for dashboard), one page at a time
 @router.get("/attendance")
-def get_all_attendance(db: Session = Depends(get_db)):
-    """Fetch all attendance records with user details (for admin dashboard)"""
-    records = (
-        db.query(models.Attendance, models.User)
-        .join(models.User, models.Attendance.user_id == models.User.id, isouter=True)
-        .order_by(models.Attendance.timestamp.desc())
-        .all()
-    )
-
-    result = []
+def get_all_attendance(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    branch: Optional[str] = None,
+    roll_no: Optional[str] = None,
+    status: Optional[str] = None,
+    q: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Newest-first attendance page; pass `next_cursor` back as `cursor` for the next one"""
+    try:
+        records, next_cursor, total = crud.get_attendance_page(
+            db, limit=limit, cursor=cursor, include_total=include_total,
+            date_from=date_from, date_to=date_to, branch=branch,
+            roll_no=roll_no, status=status, q=q,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    items = []
     for att, user in records:
-        result.append({
+        items.append({
             "id": att.id,
             "user_name": user.full_name if user else "Unknown",
             "roll_no": user.roll_no if user else "—",
@@ -34,72 +52,119 @@ def get_all_attendance(db: Session = Depends(get_db)):
             "confidence": round(att.confidence * 100, 2) if att.confidence else 0,
             "timestamp": att.timestamp
         })
-    return result
+    return {"items": items, "next_cursor": next_cursor, "total": total}
+
+
+# 📊 Reports (served from the summary tables)
+@router.get("/reports/branch_turnout")
+def report_branch_turnout(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    branch: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Per-branch daily turnout (default: last 30 days)"""
+    date_from, date_to = attendance_summary.default_range(date_from, date_to)
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "days": attendance_summary.branch_turnout(db, date_from, date_to, branch),
+    }
+
+
+@router.get("/reports/student_attendance")
+def report_student_attendance(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    branch: Optional[str] = None,
+    roll_no: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Per-student attendance percentage over a date range (default: last 30 days)"""
+    date_from, date_to = attendance_summary.default_range(date_from, date_to)
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "students": attendance_summary.student_percentages(db, date_from, date_to, branch, roll_no),
+    }
 
 
 # 🧾 Logs (optional)
 @router.get("/logs")
 def get_logs(db: Session = Depends(get_db)):
     """Fetch recent audit logs"""
+    # Include events still waiting in the write-behind queue; if the buffer is
+    # saturated, flush() gives up and we return what is already committed
+    audit_log.flush(timeout=2)
     logs = db.query(models.AuditLog).order_by(models.AuditLog.created_at.desc()).limit(50).all()
     return [{"action": l.action, "detail": l.detail, "time": l.created_at} for l in logs]
 
 
-# 📥 Export attendance as CSV
-@router.get("/export_csv")
-def export_csv(db: Session = Depends(get_db)):
-    """Export all attendance records with user info as a CSV"""
-    rows = (
-        db.query(models.Attendance, models.User)
-        .join(models.User, models.Attendance.user_id == models.User.id, isouter=True)
-        .all()
-    )
+# 📈 Runtime metrics (embedding batches, queues, caches)
+@router.get("/metrics")
+def get_metrics():
+    """Snapshot of in-process counters, gauges and latency histograms"""
+    return metrics.snapshot()
+
 
-    stream = io.StringIO()
-    writer = csv.writer(stream)
-    writer.writerow(["ID", "Name", "Roll No", "Branch", "Status", "Confidence (%)", "Timestamp"])
-    for att, user in rows:
-        writer.writerow([
-            att.id,
-            user.full_name if user else "Unknown",
-            user.roll_no if user else "—",
-            user.branch if user else "—",
-            att.status.replace("_", " "),
-            round(att.confidence * 100, 2) if att.confidence else 0,
-            att.timestamp
-        ])
-
-    stream.seek(0)
+# 📥 Export attendance as CSV (streamed from a DB cursor, optionally gzipped)
+@router.get("/export_csv")
+def export_csv(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    branch: Optional[str] = None,
+    gzip: bool = False,
+):
+    """Export attendance records with user info as a CSV, chunk by chunk"""
+    filters = {"date_from": date_from, "date_to": date_to, "branch": branch}
+    body = csv_chunks(crud.EXPORT_COLUMNS, _export_rows(filters), gzip=gzip)
+    filename = "attendance.csv.gz" if gzip else "attendance.csv"
     return StreamingResponse(
-        iter([stream.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=attendance.csv"}
+        body,
+        media_type="application/gzip" if gzip else "text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
-# -------------------- TOKEN VERIFICATION (NEW ADDITION) --------------------
+# 📊 Columnar export for analytics jobs (Parquet or Arrow IPC stream)
+@router.get("/export_columnar")
+def export_columnar(
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    branch: Optional[str] = None,
+):
+    """Same rows and filters as /export_csv, as Parquet (zstd) or an Arrow stream"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Columnar export needs the 'pyarrow' package")
+
+    filters = {"date_from": date_from, "date_to": date_to, "branch": branch}
+    if format == "parquet":
+        media_type, filename = "application/vnd.apache.parquet", "attendance.parquet"
+    else:
+        media_type, filename = "application/vnd.apache.arrow.stream", "attendance.arrows"
+    return StreamingResponse(
+        columnar_chunks(_export_rows(filters), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
-def verify_token(authorization: str = Header(None)):
-    """Verify JWT token from admin login"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing token")
 
-    token = authorization.split(" ")[1]
+def _export_rows(filters):
+    """Row chunks from a session owned by the stream (the request session closes earlier)."""
+    db = SessionLocal()
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        if payload.get("role") != "admin":
-            raise HTTPException(status_code=403, detail="Access denied (not admin)")
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        yield from crud.iter_attendance_export(db, chunk_size=EXPORT_CHUNK_ROWS, **filters)
+    finally:
+        db.close()
 
 
 # -------------------- NEW PROTECTED ROUTE (ADDED) --------------------
 
 @router.get("/records")
-def get_admin_records(user=Depends(verify_token), db: Session = Depends(get_db)):
+def get_admin_records(admin=Depends(require_admin), db: Session = Depends(get_db)):
     """
     Fetch all attendance records — accessible only to verified admins with valid JWT.
     """
@@ -130,8 +195,7 @@ def delete_attendance_record(record_id: int, db: Session = Depends(get_db)):
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
 
-    db.delete(record)
-    db.commit()
+    crud.delete_attendance(db, record)
 
     crud.log_action(db, "attendance_deleted", f"Deleted record ID={record_id}")
     return {"status": "success", "message": f"Record ID {record_id} deleted successfully"}
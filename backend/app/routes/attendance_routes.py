@@ -1,90 +1,111 @@
-from datetime import datetime, date
-from sqlalchemy import and_
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, File, Form, UploadFile, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from app import crud
 from app.auth import get_db
-from app.utils.liveness_utils import detect_liveness, verify_real_idcard
-from app.schemas import AttendanceIn, AttendanceOut, LivenessAttendanceIn
-from app.utils.face_utils import (
-    b64_to_image,
-    get_face_embedding,
-    compare_encodings
-)
-import pytesseract
-from difflib import SequenceMatcher
-import cv2
-import numpy as np
-import re
-
-# ✅ Configure Tesseract path (Windows)
-pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
+from app.utils.liveness_utils import analyze_face_frames, verify_real_idcard, LivenessStream, extract_all_face_crops
+from app.schemas import AttendanceIn, AttendanceOut, LivenessAttendanceIn, SyncBatchIn
+from app.config import WS_MIN_FRAMES, WS_MAX_FRAMES, WS_FRAME_MAX_SIDE, KIOSK_SECRETS, SYNC_MAX_BATCH
+from app.utils.face_utils import b64_to_image, bytes_to_image
+from app.utils.face_gallery import gallery
+from app.utils.embedding_service import embed_face_async, embed_faces_async
+from app.utils.ocr_utils import scan_id_card
+from app.utils.text_index import user_text_index
+from app.utils.worker_pool import run_in_pool, stage_slot, StageBusyError
+from app.utils.metrics import metrics
+from app.utils.phash_cache import image_digest, ocr_card_cache
+from app.utils.upload_utils import read_image_upload
+from app.utils.kiosk_sync import ingest_events
+from app.routes.qr_routes import get_session_branch
 
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
 
 
-# -------------------------------------------------------------------
-# 🧩 Helper Function: Text Normalizer for OCR Cleanup
-# -------------------------------------------------------------------
-def normalize_text(text):
-    """Cleans OCR text: removes symbols, fixes common misreads."""
-    text = text.lower()
-    replacements = {
-        'o': '0', 'i': '1', 'l': '1',
-        's': '5', 'b': '8', 'g': '6',
-        'z': '2', 'q': '9'
-    }
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-    text = re.sub(r'[^a-z0-9]', '', text)
-    return text
-
-
 # -------------------------------------------------------------------
 # 🎯 1️⃣ Face Attendance Route (with Liveness Detection)
 # -------------------------------------------------------------------
 @router.post("/recognize", response_model=AttendanceOut)
-def recognize_face(payload: LivenessAttendanceIn, db: Session = Depends(get_db)):
+async def recognize_face(payload: LivenessAttendanceIn, db: Session = Depends(get_db)):
     """Marks attendance using face recognition + liveness verification"""
     if not payload.image_b64_1 or not payload.image_b64_2:
         raise HTTPException(status_code=400, detail="Missing one or both image frames")
 
-    frame1 = b64_to_image(payload.image_b64_1)
-    frame2 = b64_to_image(payload.image_b64_2)
+    # Decoding, DB and gallery work run in threads so the event loop stays free
+    frame1 = await asyncio.to_thread(b64_to_image, payload.image_b64_1)
+    frame2 = await asyncio.to_thread(b64_to_image, payload.image_b64_2)
     if frame1 is None or frame2 is None:
         raise HTTPException(status_code=400, detail="Invalid frames for liveness check")
 
-    # 🧠 Step 1: Liveness detection
-    if not detect_liveness(frame1, frame2):
+    roster = await asyncio.to_thread(resolve_roster, payload.branch, payload.session_id)
+    return await mark_face_attendance(frame1, frame2, db, roster)
+
+
+@router.post("/recognize_upload", response_model=AttendanceOut)
+async def recognize_face_upload(
+    frame1: UploadFile = File(...),
+    frame2: UploadFile = File(...),
+    branch: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Same as /recognize, but the two frames arrive as multipart JPEG/PNG files"""
+    img1 = await read_image_upload(frame1)
+    img2 = await read_image_upload(frame2)
+    roster = await asyncio.to_thread(resolve_roster, branch, session_id)
+    return await mark_face_attendance(img1, img2, db, roster)
+
+
+def resolve_roster(branch=None, session_id=None):
+    """Roster to search first: an explicit branch, else the branch of the QR session"""
+    if branch:
+        return branch
+    if session_id:
+        return get_session_branch(session_id)
+    return None
+
+
+def match_face(embedding, roster=None, threshold=0.5):
+    """Best gallery match, searching the roster slice first and everyone only if needed"""
+    if roster:
+        matches = gallery.search(embedding, k=1, roster=roster)
+        if matches and matches[0][2] >= threshold:
+            return matches[0]
+        print(f"🔁 No match in roster '{roster}', falling back to global search")
+    matches = gallery.search(embedding, k=1)
+    return matches[0] if matches else None
+
+
+async def mark_face_attendance(frame1, frame2, db: Session, roster=None):
+    """Liveness → embedding → gallery match → once-per-day attendance"""
+    # 🧠 Step 1: Liveness detection (face is detected once and the crop reused)
+    is_live, face_crop = await run_in_pool("liveness", analyze_face_frames, frame1, frame2)
+    if not is_live:
         raise HTTPException(status_code=400, detail="Liveness check failed (please blink or move slightly)")
 
-    # 🧩 Step 2: Get embedding for recognition
-    embedding = get_face_embedding(frame1)
+    # 🧩 Step 2: Embed the liveness crop (the same crop enrollment stores, no second detection)
+    if face_crop is None:
+        raise HTTPException(status_code=400, detail="No face detected in frame")
+    embedding = await embed_face_async(face_crop, aligned=True)
     if embedding is None:
         raise HTTPException(status_code=400, detail="No face detected in frame")
 
-    # 🧠 Step 3: Compare with stored encodings
-    known_faces = crud.get_all_user_encodings(db)
-    best_user, best_sim = None, 0.0
+    return await asyncio.to_thread(mark_matched_face, embedding, db, roster)
 
-    for uid, name, known_enc in known_faces:
-        sim, _ = compare_encodings(known_enc, embedding)
-        if sim > best_sim:
-            best_user, best_sim = uid, sim
 
-    # ✅ Step 4: Threshold check + once-per-day validation
+def mark_matched_face(embedding, db: Session, roster=None):
+    """Gallery match → threshold → once-per-day attendance for one embedding"""
     threshold = 0.5
+
+    # 🧠 Step 3: Compare with the in-memory gallery (roster slice first, then everyone)
+    best_user, best_sim = None, 0.0
+    match = match_face(embedding, roster, threshold)
+    if match:
+        best_user, _, best_sim = match
+
+    # ✅ Step 4: Threshold check + once-per-day validation
     if best_sim >= threshold and best_user:
-        today = date.today()
-        existing_attendance = db.query(crud.models.Attendance).filter(
-            and_(
-                crud.models.Attendance.user_id == best_user,
-                crud.models.Attendance.timestamp >= datetime.combine(today, datetime.min.time()),
-                crud.models.Attendance.timestamp <= datetime.combine(today, datetime.max.time())
-            )
-        ).first()
-
-        if existing_attendance:
+        if crud.is_attendance_marked_today(db, best_user):
             raise HTTPException(status_code=400, detail="Attendance already marked for today ")
 
         att = crud.create_attendance(db, best_user, "present_via_face", best_sim)
@@ -96,111 +117,231 @@ def recognize_face(payload: LivenessAttendanceIn, db: Session = Depends(get_db))
 
 
 # -------------------------------------------------------------------
-# 🪪 2️⃣ ID Card Attendance Route (OCR-based + Anti-spoof + Smart Crop)
+# 📡 Streaming Face Attendance (WebSocket, incremental liveness)
 # -------------------------------------------------------------------
-def is_similar(a, b, threshold=0.7):
-    """Fuzzy string similarity for OCR matching"""
-    return SequenceMatcher(None, a, b).ratio() >= threshold
+# Client sends small frames (binary JPEG or base64 text) until the server
+# answers with a final message:
+#   {"status": "collecting", "frames": n}                 ← after each frame
+#   {"status": "present_via_face", "id": .., "user_id": .., "confidence": ..}
+#   {"status": "failed", "detail": "..."}
+@router.websocket("/ws/recognize")
+async def recognize_face_stream(
+    websocket: WebSocket,
+    branch: Optional[str] = None,
+    session_id: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    await websocket.accept()
+    stream = LivenessStream(min_frames=WS_MIN_FRAMES, max_frames=WS_MAX_FRAMES)
+    try:
+        decision = None
+        while decision is None:
+            message = await websocket.receive()
+            if message.get("type") == "websocket.disconnect":
+                return
+            try:
+                if message.get("bytes"):
+                    frame = await asyncio.to_thread(bytes_to_image, message["bytes"], WS_FRAME_MAX_SIDE)
+                else:
+                    frame = await asyncio.to_thread(b64_to_image, message.get("text") or "", WS_FRAME_MAX_SIDE)
+            except Exception:
+                await websocket.send_json({"status": "failed", "detail": "Invalid frame"})
+                return
+
+            async with stage_slot("liveness"):
+                decision = await asyncio.to_thread(stream.update, frame)
+            if decision is None:
+                await websocket.send_json({"status": "collecting", "frames": stream.frames})
+
+        print(f"📡 Stream liveness={decision} after {stream.frames} frames: {stream.summary()}")
+        if decision != "live":
+            await websocket.send_json({
+                "status": "failed",
+                "detail": "Liveness check failed (please blink or move slightly)",
+            })
+            return
+
+        # 🧩 Recognition runs once, on the sharpest face seen in the stream
+        embedding = await embed_face_async(stream.best_crop, aligned=True)
+        if embedding is None:
+            await websocket.send_json({"status": "failed", "detail": "No face detected in frame"})
+            return
+        try:
+            roster = await asyncio.to_thread(resolve_roster, branch, session_id)
+            att = await asyncio.to_thread(mark_matched_face, embedding, db, roster)
+        except HTTPException as e:
+            await websocket.send_json({"status": "failed", "detail": e.detail})
+            return
+        await websocket.send_json({
+            "status": att.status,
+            "id": att.id,
+            "user_id": att.user_id,
+            "confidence": att.confidence,
+            "timestamp": att.timestamp.isoformat() if att.timestamp else None,
+        })
+    except StageBusyError as e:
+        await websocket.send_json({"status": "busy", "retry_after": e.retry_after})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
 
 
+# -------------------------------------------------------------------
+# 👥 Group Photo Attendance (whole classroom in one request)
+# -------------------------------------------------------------------
+@router.post("/group_recognize")
+async def recognize_group_photo(
+    photos: List[UploadFile] = File(...),
+    branch: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Detects every face in one or more classroom photos and marks all recognised students"""
+    threshold = 0.5  # server-side, same as mark_matched_face (no liveness check on this route)
+
+    # 🔍 Step 1: Detect + align all faces in every photo
+    faces = []  # (photo_index, box, crop)
+    for photo_idx, upload in enumerate(photos):
+        img = await read_image_upload(upload, max_side=None)
+        for box, crop in await run_in_pool("liveness", extract_all_face_crops, img):
+            faces.append((photo_idx, box, crop))
+    if not faces:
+        raise HTTPException(status_code=400, detail="No faces detected in the photo(s)")
+
+    # 🧩 Step 2: Embed all faces as one batch, match them in one vectorised step
+    embeddings = await embed_faces_async([crop for _, _, crop in faces], aligned=True)
+    roster = await asyncio.to_thread(resolve_roster, branch, session_id)
+    matches = await asyncio.to_thread(match_group_faces, embeddings, roster, threshold)
+
+    # 👤 Step 3: One face per student (keep the most confident), split matched / unmatched
+    best_by_user, unmatched = {}, []
+    for (photo_idx, box, _), match in zip(faces, matches):
+        face_info = {"photo": photo_idx, "box": list(box)}
+        if match is None or match[2] < threshold:
+            unmatched.append({**face_info, "best_confidence": round(match[2], 4) if match else None})
+            continue
+        user_id, full_name, sim = match
+        if user_id not in best_by_user or sim > best_by_user[user_id]["confidence"]:
+            best_by_user[user_id] = {**face_info, "user_id": user_id, "full_name": full_name, "confidence": sim}
+
+    # ✅ Step 4: Once-per-day check + all new rows in one transaction
+    already, to_mark = await asyncio.to_thread(mark_group_attendance, db, best_by_user, len(faces), len(unmatched))
+
+    for m in best_by_user.values():
+        m["confidence"] = round(m["confidence"], 4)
+    return {
+        "faces_detected": len(faces),
+        "marked": to_mark,
+        "already_marked": [m for uid, m in best_by_user.items() if uid in already],
+        "unmatched": unmatched,
+    }
+
+
+def match_group_faces(embeddings, roster, threshold):
+    """Best match per embedding (None for faces without one): roster slice first, then everyone"""
+    kept = [i for i, emb in enumerate(embeddings) if emb is not None]
+    matches = [None] * len(embeddings)
+    if kept and roster:
+        # Roster slice first; only faces it cannot explain go to the global search
+        for i, match in zip(kept, gallery.search_many([embeddings[i] for i in kept], roster=roster)):
+            matches[i] = match
+        kept = [i for i in kept if matches[i] is None or matches[i][2] < threshold]
+    if kept:
+        for i, match in zip(kept, gallery.search_many([embeddings[i] for i in kept])):
+            if matches[i] is None or match[2] > matches[i][2]:
+                matches[i] = match
+    return matches
+
+
+def mark_group_attendance(db: Session, best_by_user, faces, unmatched):
+    """Marks every matched student not yet present today → (already marked ids, newly marked)"""
+    already = crud.get_user_ids_marked_today(db, best_by_user.keys())
+    to_mark = [m for uid, m in best_by_user.items() if uid not in already]
+    if to_mark:
+        crud.create_attendance_bulk(
+            db, [(m["user_id"], "present_via_group_photo", m["confidence"]) for m in to_mark]
+        )
+    crud.log_action(
+        db, "attendance_marked_group",
+        f"faces={faces}, marked={len(to_mark)}, already={len(already)}, unmatched={unmatched}"
+    )
+    return already, to_mark
+
+
+# -------------------------------------------------------------------
+# 🪪 2️⃣ ID Card Attendance Route (OCR-based + Anti-spoof + Smart Crop)
+# -------------------------------------------------------------------
 @router.post("/id_recognize")
-def recognize_id_card(payload: AttendanceIn, db: Session = Depends(get_db)):
+async def recognize_id_card(payload: AttendanceIn, db: Session = Depends(get_db)):
     """Marks attendance using ID card OCR (Name + Roll No + Branch)"""
     if not payload.image_b64:
         raise HTTPException(status_code=400, detail="No ID image received")
 
-    img_np = b64_to_image(payload.image_b64)
+    img_np = await asyncio.to_thread(b64_to_image, payload.image_b64)
+    return await mark_id_attendance(img_np, db)
 
-    # ✅ Step 0: Verify real physical ID card
-    if not verify_real_idcard(img_np):
-        raise HTTPException(
-            status_code=400,
-            detail="Fake or digital ID detected — please show a real physical ID card."
-        )
 
-    # ✅ Step 1: Try ROI (bottom 30%) and full ID fallback
-    height, width, _ = img_np.shape
-    roi = img_np[int(height * 0.6):int(height * 0.9), int(width * 0.05):int(width * 0.95)]
-    images_to_try = [roi, img_np]
-    extracted_text, clean_text = "", ""
-    text_found = False
-
-    for idx, img in enumerate(images_to_try):
-        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        gray = cv2.bilateralFilter(gray, 9, 75, 75)
-        gray = cv2.convertScaleAbs(gray, alpha=2.0, beta=25)
-        gray = cv2.medianBlur(gray, 3)
-        gray = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 11
-        )
+@router.post("/id_recognize_upload")
+async def recognize_id_card_upload(id_image: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Same as /id_recognize, but the ID card arrives as a multipart JPEG/PNG file"""
+    img_np = await read_image_upload(id_image)
+    return await mark_id_attendance(img_np, db)
 
-        if np.mean(gray) < 130:
-            gray = cv2.bitwise_not(gray)
 
-        custom_config = (
-            r'--oem 3 --psm 7 '
-            r'-c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789abcdefghijklmnopqrstuvwxyz'
-        )
-
-        text_try = pytesseract.image_to_string(gray, lang="eng", config=custom_config).lower().strip()
+async def read_card_text(img_np):
+    """Finds the text lines and OCRs them as one stitched page → (text, roll)."""
+    extracted_text, detected_roll, lines, used_fallback = await run_in_pool("ocr", scan_id_card, img_np)
+    metrics.observe("ocr.lines_per_card", lines)
+    if used_fallback:
+        # No usable line found → old ROI (bottom 30%) + full-card fallback
+        metrics.inc("ocr.fallback_full_card")
+    return extracted_text, detected_roll
 
-        if text_try:
-            extracted_text = text_try
-            clean_text = normalize_text(extracted_text)
-            print(f"✅ Text found on attempt {idx + 1}: {extracted_text}")
-            text_found = True
-            break
 
-    if not text_found or not extracted_text.strip():
-        raise HTTPException(status_code=400, detail="No readable text found on ID card")
+async def mark_id_attendance(img_np, db: Session):
+    """Anti-spoof → OCR → roll/name match → once-per-day attendance"""
+    # ✅ Step 0: Verify real physical ID card
+    if not await run_in_pool("liveness", verify_real_idcard, img_np):
+        raise HTTPException(
+            status_code=400,
+            detail="Fake or digital ID detected — please show a real physical ID card."
+        )
 
-    # ✅ Step 2: Detect Roll No pattern
-    roll_matches = re.findall(r"[a-z]{1,3}\d{2,6}[a-z0-9]{0,4}", extracted_text)
-    detected_roll = roll_matches[0].replace(" ", "").replace("-", "") if roll_matches else None
+    # ✅ Step 1: OCR text of this card (an identical resent image comes from the result cache)
+    card_key = await asyncio.to_thread(image_digest, img_np)
+    cached = ocr_card_cache.get(card_key)
+    if cached is not None:
+        extracted_text, detected_roll = cached
+    else:
+        extracted_text, detected_roll = await read_card_text(img_np)
+        ocr_card_cache.put(card_key, (extracted_text, detected_roll))
     if detected_roll:
         print(f"🎯 Detected Roll No (Pattern Match): {detected_roll}")
 
-    # ✅ Step 3: Match with Database
-    users = crud.get_all_users(db)
-    matched_user = None
-
-    for u in users:
-        full_name = u.full_name.lower() if getattr(u, "full_name", None) else ""
-        roll_no = str(u.roll_no).lower().replace(" ", "").replace("-", "") if getattr(u, "roll_no", None) else ""
-        branch = u.branch.lower() if getattr(u, "branch", None) else ""
-
-        if roll_no and roll_no in clean_text:
-            matched_user = u
-            print(f"✅ Roll No matched directly: {roll_no}")
-            break
+    if not extracted_text.strip():
+        raise HTTPException(status_code=400, detail="No readable text found on ID card")
 
-        if detected_roll and roll_no and (detected_roll in roll_no or roll_no in detected_roll):
-            matched_user = u
-            print(f"✅ Roll No matched (pattern): {roll_no}")
-            break
+    return await asyncio.to_thread(mark_matched_id, extracted_text, db)
 
-        if SequenceMatcher(None, roll_no, clean_text).ratio() > 0.65:
-            matched_user = u
-            print(f"✅ Fuzzy Roll No match for: {roll_no}")
-            break
 
-        if is_similar(full_name, extracted_text, 0.4) or is_similar(branch, extracted_text, 0.4):
-            matched_user = u
-            print(f"✅ Matched by name/branch: {u.full_name}")
+def mark_matched_id(extracted_text, db: Session):
+    """Roll/name index lookup → once-per-day attendance for the OCR text of one card"""
+    # ✅ Step 2: Look the text up in the roll-number / name index
+    candidates = user_text_index.search(extracted_text)
+    matched_user = None
+    for cand in candidates:
+        matched_user = crud.get_user(db, cand.user_id)
+        if matched_user:
+            print(f"✅ Matched {matched_user.roll_no} ({cand.kind}, score={cand.score})")
             break
 
-    # ✅ Step 4: Mark attendance (once per day)
+    # ✅ Step 3: Mark attendance (once per day)
     if matched_user:
-        today = date.today()
-        existing_attendance = db.query(crud.models.Attendance).filter(
-            and_(
-                crud.models.Attendance.user_id == matched_user.id,
-                crud.models.Attendance.timestamp >= datetime.combine(today, datetime.min.time()),
-                crud.models.Attendance.timestamp <= datetime.combine(today, datetime.max.time())
-            )
-        ).first()
-
-        if existing_attendance:
+        if crud.is_attendance_marked_today(db, matched_user.id):
             raise HTTPException(status_code=400, detail="Attendance already marked for today ✅")
 
         att = crud.create_attendance(db, matched_user.id, "present_via_id", 1.0)
@@ -214,3 +355,20 @@ def recognize_id_card(payload: AttendanceIn, db: Session = Depends(get_db)):
 
     crud.log_action(db, "attendance_unknown_id", f"text={extracted_text[:80]}...")
     raise HTTPException(status_code=404, detail="ID not recognized. Try better lighting or ensure Roll No is visible.")
+
+
+# -------------------------------------------------------------------
+# 🔄 3️⃣ Offline Kiosk Sync (signed, idempotent bulk ingest)
+# -------------------------------------------------------------------
+@router.post("/sync")
+def sync_kiosk_events(payload: SyncBatchIn, db: Session = Depends(get_db)):
+    """Stores a batch of buffered kiosk events in one transaction; per-event results"""
+    secret = KIOSK_SECRETS.get(payload.kiosk_id)
+    if not secret:
+        raise HTTPException(status_code=401, detail="Unknown kiosk")
+    if len(payload.events) > SYNC_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {SYNC_MAX_BATCH} events per sync")
+
+    response = ingest_events(db, payload.kiosk_id, secret, payload.events)
+    crud.log_action(db, "attendance_kiosk_sync", f"kiosk={payload.kiosk_id}, {response['summary']}")
+    return response
@@ -1,24 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 from app.auth import get_db
 from app import crud
-import qrcode
-import os, json, time, uuid
-from datetime import datetime
+from app.config import QR_SESSION_TTL_S, QR_ROTATE_S, QR_ROTATING_SESSION_S
+from app.utils.qr_sessions import qr_sessions
+from app.utils.qr_utils import (
+    generate_qr_token, verify_qr_token, verify_session_token, epoch_token, current_epoch,
+    render_qr, qr_data_url, save_qr_file, MEDIA_TYPES,
+)
+import asyncio, json, time, uuid
 
 router = APIRouter(prefix="/qr", tags=["QR Attendance"])
 
-# ------------------------------
-# ✅ Absolute folder for QR images
-# ------------------------------
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-QR_FOLDER = os.path.join(BASE_DIR, "generated_qr")
-os.makedirs(QR_FOLDER, exist_ok=True)
-
-# Active sessions
-active_qr_tokens = {}
-recently_used_qr = {}
+# QR codes carry a signed token (utils/qr_utils.py): verifying a scan needs
+# no server state. The session store only keeps the optional branch roster
+# and per-device scans.
 
 # -------------------------------------------------------------------
 # 📦 Generate QR Code (Teacher Side)
@@ -27,27 +24,33 @@ recently_used_qr = {}
 async def generate_qr(request: Request, db: Session = Depends(get_db)):
     data = await request.json()
     subject = data.get("subject")
+    branch = data.get("branch")  # optional roster for face matching in this session
     if not subject:
         raise HTTPException(status_code=400, detail="Subject or lab not provided")
 
+    # Rotating mode: the QR changes every QR_ROTATE_S, frames are pushed over SSE
+    rotate = bool(data.get("rotate"))
+    ttl_s = QR_ROTATING_SESSION_S if rotate else QR_SESSION_TTL_S
+
     # Unique session for this QR
-    session_id = str(uuid.uuid4())
+    session_id = uuid.uuid4().hex
+    issued_at = time.time()
+    token = generate_qr_token(session_id, subject, branch, expires_at=issued_at + ttl_s,
+                              rotate_s=QR_ROTATE_S if rotate else None)
 
     payload = {
         "session_id": session_id,
         "subject": subject,
-        "timestamp": time.time(),
-        "expires_in": 300  # 5 minutes validity
+        "branch": branch,
+        "timestamp": issued_at,
+        "expires_in": ttl_s  # 5 minutes validity by default (1 hour for rotating sessions)
     }
 
-    # Save QR to file
-    qr_img = qrcode.make(json.dumps(payload))
-    qr_path = os.path.join(QR_FOLDER, f"{session_id}.png")
-    qr_img.save(qr_path)
-
-    # Keep active session
-    active_qr_tokens[session_id] = payload
-    print(f"✅ QR generated for: {subject} ({session_id})")
+    # Keep active session (expires on its own after ttl_s); PNG on disk only for static QRs, if enabled
+    qr_sessions.create(session_id, payload, ttl_s)
+    if not rotate:
+        save_qr_file(token, session_id)
+    print(f"✅ QR generated for: {subject} ({session_id}{', rotating' if rotate else ''})")
 
     # Dynamically detect the host IP instead of hardcoding
     host_ip = request.client.host or "localhost"
@@ -55,23 +58,87 @@ async def generate_qr(request: Request, db: Session = Depends(get_db)):
         # If running locally, replace with your LAN IP
         host_ip = "192.168.33.136"
 
-    qr_url = f"http://{host_ip}:8000/qr/image/{session_id}"
-
-    return {
-        "qr_url": qr_url,
+    base_url = f"http://{host_ip}:8000/qr"
+    response = {
+        "session_id": session_id,
         "subject": subject,
-        "expires_in": 300
+        "expires_in": ttl_s
     }
+    if rotate:
+        # `token` only opens the stream; students scan the per-epoch tokens it pushes
+        session = verify_session_token(token, now=issued_at)
+        response.update(
+            mode="rotating",
+            stream_url=f"{base_url}/stream/{token}",
+            qr_url=f"{base_url}/image/{epoch_token(session, current_epoch(QR_ROTATE_S, issued_at))}",
+            rotate_s=QR_ROTATE_S,
+        )
+    else:
+        response.update(
+            mode="static",
+            qr_url=f"{base_url}/image/{token}",
+            svg_url=f"{base_url}/image/{token}?format=svg",
+            token=token,
+        )
+    return response
+
+def get_session_branch(session_id):
+    """Branch (roster) attached to an active QR session, if any"""
+    session = qr_sessions.get(session_id) if session_id else None
+    return session.get("branch") if session else None
 
 # -------------------------------------------------------------------
-# 🖼️ Serve the generated QR image
+# 🖼️ Serve the QR image (rendered in memory from the token, LRU-cached)
 # -------------------------------------------------------------------
-@router.get("/image/{session_id}")
-def get_qr_image(session_id: str):
-    path = os.path.join(QR_FOLDER, f"{session_id}.png")
-    if not os.path.exists(path):
+@router.get("/image/{token}")
+def get_qr_image(token: str, format: str = Query("png", pattern="^(png|svg)$")):
+    claims = verify_qr_token(token)
+    if not claims:
         raise HTTPException(status_code=404, detail="QR not found or expired")
-    return FileResponse(path, media_type="image/png")
+    return Response(
+        content=render_qr(token, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Cache-Control": f"private, max-age={max(0, int(claims['exp'] - time.time()))}"},
+    )
+
+# -------------------------------------------------------------------
+# 🔁 Rotating QR stream for the teacher screen (Server-Sent Events)
+# -------------------------------------------------------------------
+# event: qr       {"token", "epoch", "image" (data URL), "rotates_in", "expires_in"}
+# event: expired  once the session is over (stream ends)
+@router.get("/stream/{session_token}")
+async def stream_rotating_qr(session_token: str, request: Request,
+                             format: str = Query("svg", pattern="^(png|svg)$")):
+    session = verify_session_token(session_token)
+    if not session:
+        raise HTTPException(status_code=404, detail="QR session not found or expired")
+    return StreamingResponse(
+        _rotating_frames(request, session, format),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _rotating_frames(request: Request, session, fmt):
+    rotate_s = session["rotate_s"]
+    yield "retry: 2000\n\n"
+    while not await request.is_disconnected():
+        now = time.time()
+        if now >= session["exp"]:
+            yield "event: expired\ndata: {}\n\n"
+            return
+        epoch = current_epoch(rotate_s, now)
+        token = epoch_token(session, epoch)
+        next_at = (epoch + 1) * rotate_s
+        frame = {
+            "token": token,
+            "epoch": epoch,
+            "image": await asyncio.to_thread(qr_data_url, token, fmt),   # rendered once per epoch (LRU)
+            "rotates_in": round(next_at - now, 2),
+            "expires_in": int(session["exp"] - now),
+        }
+        yield f"event: qr\nid: {epoch}\ndata: {json.dumps(frame)}\n\n"
+        await asyncio.sleep(max(0.05, next_at - time.time()))
 
 # -------------------------------------------------------------------
 # 📱 Verify QR Scan (Student Side)
@@ -80,27 +147,12 @@ def get_qr_image(session_id: str):
 def verify_qr(data: dict, request: Request, db: Session = Depends(get_db)):
     """Verifies scanned QR and marks attendance for a student."""
     try:
-        # Parse the QR token
-        session_data = json.loads(data.get("token", ""))
-        session_id = session_data["session_id"]
-        subject = session_data.get("subject")
-
-        # Validate session existence
-        if session_id not in active_qr_tokens:
+        # Check the token signature + expiry (no server-side lookup)
+        claims = verify_qr_token(data.get("token", ""))
+        if claims is None:
             raise HTTPException(status_code=400, detail="QR expired or invalid")
-
-        # Check expiry
-        now = time.time()
-        if now - active_qr_tokens[session_id]["timestamp"] > 300:
-            del active_qr_tokens[session_id]
-            raise HTTPException(status_code=400, detail="QR expired, please scan a new one")
-
-        # Prevent re-scan from same device
-        device_ip = request.client.host
-        if device_ip in recently_used_qr and recently_used_qr[device_ip] == session_id:
-            raise HTTPException(status_code=400, detail="QR already used from this device")
-
-        recently_used_qr[device_ip] = session_id
+        session_id = claims["session_id"]
+        subject = claims["subject"]
 
         # Validate student by roll number
         roll_no = data.get("roll_no")
@@ -108,10 +160,13 @@ def verify_qr(data: dict, request: Request, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=404, detail="Student not found")
 
+        # Prevent re-scan from same device (remembered until the session expires)
+        device_ip = request.client.host
+        if not qr_sessions.mark_device(session_id, device_ip, claims["exp"]):
+            raise HTTPException(status_code=400, detail="QR already used from this device")
+
         # Prevent duplicate attendance same day
-        today = datetime.now().date()
-        existing = crud.get_attendance_today(db, user.id)
-        if existing:
+        if crud.is_attendance_marked_today(db, user.id):
             raise HTTPException(status_code=400, detail="Attendance already marked for today ✅")
 
         # Create attendance entry
@@ -124,6 +179,8 @@ def verify_qr(data: dict, request: Request, db: Session = Depends(get_db)):
             "subject": subject
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"⚠️ QR Verify Error: {e}")
         raise HTTPException(status_code=400, detail="Invalid or corrupted QR data")
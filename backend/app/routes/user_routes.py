@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Form, File, UploadFile
 from sqlalchemy.orm import Session
 from app import crud
-from app.auth import get_db, get_current_user
-from app.utils.face_utils import b64_to_image, get_face_embedding, preprocess_for_ocr_cv2
-import pytesseract
-
-# ✅ Configure Tesseract for OCR (Windows)
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+from app.auth import get_db, get_principal, require_admin
+from app.utils.face_utils import b64_to_image
+from app.utils.embedding_service import embed_face_async
+from app.utils.ocr_utils import read_id_text
+from app.utils.liveness_utils import extract_face_crop
+from app.utils.worker_pool import run_in_pool, StageBusyError
+from app.utils.upload_utils import read_image_upload
+from app.utils.face_gallery import gallery
+from app.utils.text_index import user_text_index
 
 router = APIRouter(prefix="/users", tags=["User"])
 
@@ -14,7 +18,7 @@ router = APIRouter(prefix="/users", tags=["User"])
 # 🧍 User Enrollment (Face + ID Card)
 # -------------------------------------------------------------------
 @router.post("/enroll")
-def enroll_user(
+async def enroll_user(
     full_name: str = Form(...),
     roll_no: str = Form(...),
     branch: str = Form(...),
@@ -23,7 +27,64 @@ def enroll_user(
     db: Session = Depends(get_db)
 ):
     print(f"📩 Enrollment request received for: {roll_no} ({branch})")
+    try:
+        face_img = await asyncio.to_thread(b64_to_image, face_image_b64)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Face processing failed: {str(e)}")
+    try:
+        id_img = await asyncio.to_thread(b64_to_image, id_image_b64)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"OCR failed: {str(e)}")
+
+    return await enroll_student(full_name, roll_no, branch, face_img, id_img, db)
+
+
+@router.post("/enroll_upload")
+async def enroll_user_upload(
+    full_name: str = Form(...),
+    roll_no: str = Form(...),
+    branch: str = Form(...),
+    face_image: UploadFile = File(...),
+    id_image: UploadFile = File(...),
+    db: Session = Depends(get_db)
+):
+    """Same as /enroll, but the face and ID images arrive as multipart JPEG/PNG files"""
+    print(f"📩 Enrollment upload received for: {roll_no} ({branch})")
+    face_img = await read_image_upload(face_image)
+    id_img = await read_image_upload(id_image)
+    return await enroll_student(full_name, roll_no, branch, face_img, id_img, db)
+
+
+async def enroll_student(full_name, roll_no, branch, face_img, id_img, db: Session):
+    """Creates the user, stores the face embedding and the OCR text of the ID card"""
+    # DB writes and gallery updates run in threads so the event loop stays free
+    user = await asyncio.to_thread(create_student, full_name, roll_no, branch, db)
+
+    # ✅ Process face image → generate embedding
+    try:
+        await asyncio.to_thread(store_face_embedding, db, user, await embed_enrollment_face(face_img))
+    except (StageBusyError, HTTPException):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Face processing failed: {str(e)}")
+
+    # ✅ Process ID card → OCR extraction
+    try:
+        text = await run_in_pool("ocr", read_id_text, id_img)
+        await asyncio.to_thread(crud.save_id_ocr, db, user.id, text)
+    except StageBusyError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"OCR failed: {str(e)}")
 
+    # ✅ Log user enrollment
+    await asyncio.to_thread(crud.log_action, db, "user_enrolled", f"Roll No: {roll_no}, Branch: {branch}")
+
+    return {"status": "enrolled", "user_id": user.id, "roll_no": roll_no, "branch": branch}
+
+
+def create_student(full_name, roll_no, branch, db: Session):
+    """Inserts the user row (roll numbers are unique) and indexes it for ID-card lookups"""
     # ✅ Check if Roll Number already exists
     existing = db.query(crud.models.User).filter_by(roll_no=roll_no).first()
     if existing:
@@ -38,38 +99,56 @@ def enroll_user(
     db.add(user)
     db.commit()
     db.refresh(user)
+    user_text_index.add(user.id, roll_no, full_name)
+    return user
 
-    # ✅ Process face image → generate embedding
-    try:
-        face_img = b64_to_image(face_image_b64)
-        embedding = get_face_embedding(face_img)
-        if embedding is None:
-            raise HTTPException(status_code=400, detail="No face detected in the face image")
-        crud.save_face_encoding(db, user.id, embedding)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Face processing failed: {str(e)}")
 
-    # ✅ Process ID card → OCR extraction
+async def embed_enrollment_face(face_img):
+    """Same Haar detection + alignment as attendance, so enrolled and live embeddings match"""
+    face_crop = await run_in_pool("liveness", extract_face_crop, face_img)
+    embedding = await embed_face_async(face_crop, aligned=True) if face_crop is not None else None
+    if embedding is None:
+        raise HTTPException(status_code=400, detail="No face detected in the face image")
+    return embedding
+
+
+def store_face_embedding(db: Session, user, embedding):
+    crud.save_face_encoding(db, user.id, embedding)
+    gallery.add(user.id, user.full_name, embedding, user.branch)
+
+
+# -------------------------------------------------------------------
+# 🔁 Re-enroll a student's face (admin; keeps the user and attendance history)
+# -------------------------------------------------------------------
+# For encodings from an older face crop (see migrate_embeddings.py --list-stale)
+@router.post("/reenroll_face/{user_id}")
+async def reenroll_face(
+    user_id: int,
+    face_image_b64: str = Form(...),
+    admin=Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    user = await asyncio.to_thread(crud.get_user, db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     try:
-        id_img = b64_to_image(id_image_b64)
-        id_proc = preprocess_for_ocr_cv2(id_img)
-        text = pytesseract.image_to_string(id_proc, lang="eng")
-        crud.save_id_ocr(db, user.id, text)
+        face_img = await asyncio.to_thread(b64_to_image, face_image_b64)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"OCR failed: {str(e)}")
-
-    # ✅ Log user enrollment
-    crud.log_action(db, "user_enrolled", f"Roll No: {roll_no}, Branch: {branch}")
+        raise HTTPException(status_code=400, detail=f"Face processing failed: {str(e)}")
 
-    return {"status": "enrolled", "user_id": user.id, "roll_no": roll_no, "branch": branch}
+    embedding = await embed_enrollment_face(face_img)
+    await asyncio.to_thread(store_face_embedding, db, user, embedding)
+    await asyncio.to_thread(crud.log_action, db, "user_face_reenrolled", f"Roll No: {user.roll_no}")
+    return {"status": "face_updated", "user_id": user.id, "roll_no": user.roll_no}
 
 
 # -------------------------------------------------------------------
 # 👤 Current User Info (if auth enabled later)
 # -------------------------------------------------------------------
 @router.get("/me")
-def current_user(user=Depends(get_current_user)):
-    return {"id": user.id, "roll_no": user.roll_no, "full_name": user.full_name, "branch": user.branch}
+def current_user(principal=Depends(get_principal)):
+    return {"id": principal.user_id, "roll_no": principal.roll_no, "full_name": principal.full_name,
+            "branch": principal.branch}
 
 
 # -------------------------------------------------------------------
@@ -81,7 +160,8 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    crud.delete_user(db, user)
+    gallery.remove(user_id)
+    user_text_index.remove(user_id)
     crud.log_action(db, "user_deleted", f"Deleted user {user_id}")
     return {"status": "deleted"}
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -47,3 +47,22 @@ class LivenessAttendanceIn(BaseModel):
     image_b64_1: str
     image_b64_2: str
     threshold: Optional[float] = 0.5
+    # Optional roster context: match this branch (or the QR session's branch) first
+    branch: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+# 🔄 Offline kiosk sync (signed, idempotent batch)
+class SyncEventIn(BaseModel):
+    event_id: str                     # idempotency key, unique per kiosk
+    user_id: Optional[int] = None     # student by id ...
+    roll_no: Optional[str] = None     # ... or by roll number
+    method: str = "face"              # face | id | qr
+    confidence: Optional[float] = None
+    timestamp: str                    # ISO 8601 capture time on the kiosk (signed as sent)
+    signature: str                    # hex HMAC-SHA256, see utils/kiosk_sync.py
+
+
+class SyncBatchIn(BaseModel):
+    kiosk_id: str
+    events: List[SyncEventIn]
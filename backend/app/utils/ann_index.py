@@ -0,0 +1,175 @@
+import os
+import threading
+import numpy as np
+
+# -------------------------------------------------------------------
+# 🗂️ IVF Approximate Nearest-Neighbour Index (pure NumPy)
+# -------------------------------------------------------------------
+# A coarse k-means quantiser splits the gallery into `nlist` cells.
+# A probe is compared with the centroids first and then only with the
+# embeddings in its `nprobe` closest cells, so the cost per search is
+# roughly (nlist + N * nprobe / nlist) dot products instead of N.
+# All vectors are expected to be L2-normalised (cosine == dot product).
+
+
+def _spherical_kmeans(vectors, nlist, iterations=10, seed=0):
+    """Small spherical k-means used to train the coarse quantiser."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=nlist)
+
+        # Re-seed empty cells with random points so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def auto_nlist(n):
+    """Rule of thumb: about 4 * sqrt(N) cells, at least 1."""
+    return max(1, min(n, int(4 * np.sqrt(n))))
+
+
+class IVFIndex:
+    """Inverted-file index over (user_id, embedding) pairs with incremental updates."""
+
+    def __init__(self, dim, nlist=0, nprobe=8):
+        self._lock = threading.RLock()
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.trained_size = 0
+        self._list_vectors = []
+        self._list_ids = []
+        self._cell_of = {}
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def needs_retrain(self, n):
+        """True when the gallery has grown far beyond what the quantiser was trained on."""
+        return not self.is_trained or n > 4 * max(self.trained_size, 1)
+
+    # ---------------------------------------------------------------
+    # 🏋️ Training / bulk build
+    # ---------------------------------------------------------------
+    def train(self, vectors, sample_size=20000):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = self.nlist or auto_nlist(len(vectors))
+        nlist = min(nlist, len(vectors))
+        if len(vectors) > sample_size:
+            idx = np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)
+            vectors = vectors[idx]
+        with self._lock:
+            self.centroids = _spherical_kmeans(vectors, nlist)
+            self.nlist = nlist
+            self.trained_size = len(vectors)
+
+    def build(self, user_ids, vectors):
+        """Assigns all vectors to their cells in one pass (centroids must be trained)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        with self._lock:
+            assign = np.argmax(vectors @ self.centroids.T, axis=1) if len(vectors) else np.empty(0, int)
+            self._list_vectors = []
+            self._list_ids = []
+            self._cell_of = {}
+            for cell in range(self.nlist):
+                rows = np.flatnonzero(assign == cell)
+                self._list_vectors.append(np.ascontiguousarray(vectors[rows]))
+                self._list_ids.append(user_ids[rows].copy())
+                for uid in self._list_ids[cell]:
+                    self._cell_of[int(uid)] = cell
+
+    # ---------------------------------------------------------------
+    # 🔄 Incremental updates (enroll / delete)
+    # ---------------------------------------------------------------
+    def add(self, user_id, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            self.remove(user_id)
+            cell = int(np.argmax(self.centroids @ vector[0]))
+            self._list_vectors[cell] = np.vstack([self._list_vectors[cell], vector])
+            self._list_ids[cell] = np.append(self._list_ids[cell], np.int64(user_id))
+            self._cell_of[user_id] = cell
+
+    def remove(self, user_id):
+        with self._lock:
+            cell = self._cell_of.pop(user_id, None)
+            if cell is None:
+                return False
+            keep = self._list_ids[cell] != user_id
+            self._list_vectors[cell] = self._list_vectors[cell][keep]
+            self._list_ids[cell] = self._list_ids[cell][keep]
+            return True
+
+    # ---------------------------------------------------------------
+    # 🔍 Search
+    # ---------------------------------------------------------------
+    def search(self, probe, k=1, nprobe=None):
+        """Returns up to `k` (user_id, similarity) pairs sorted best first."""
+        probe = np.asarray(probe, dtype=np.float32).reshape(-1)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        with self._lock:
+            if not self._cell_of:
+                return []
+            cell_sims = self.centroids @ probe
+            cells = np.argpartition(-cell_sims, nprobe - 1)[:nprobe]
+            vectors = [self._list_vectors[c] for c in cells if len(self._list_ids[c])]
+            if not vectors:
+                return []
+            ids = np.concatenate([self._list_ids[c] for c in cells if len(self._list_ids[c])])
+            sims = np.concatenate(vectors) @ probe if len(vectors) > 1 else vectors[0] @ probe
+
+        k = min(k, len(ids))
+        top = np.argpartition(-sims, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+        top = top[np.argsort(-sims[top])]
+        return [(int(ids[i]), float(sims[i])) for i in top]
+
+    # ---------------------------------------------------------------
+    # 💾 Persistence
+    # ---------------------------------------------------------------
+    # Embeddings already live in the database, so only the trained
+    # quantiser is written to disk. Re-assigning N vectors at startup is
+    # one matrix product; re-running k-means is what we want to avoid.
+    def save(self, path):
+        with self._lock:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    centroids=self.centroids,
+                    nprobe=np.int64(self.nprobe),
+                    trained_size=np.int64(self.trained_size),
+                )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, dim):
+        """Loads a saved quantiser, or returns None if missing or incompatible."""
+        if not os.path.exists(path):
+            return None
+        try:
+            data = np.load(path)
+            centroids = data["centroids"].astype(np.float32)
+        except Exception as e:
+            print(f"⚠️ Could not read face index {path}: {e}")
+            return None
+        if centroids.ndim != 2 or centroids.shape[1] != dim:
+            return None
+        index = cls(dim, nlist=centroids.shape[0], nprobe=int(data["nprobe"]))
+        index.centroids = centroids
+        index.trained_size = int(data["trained_size"])
+        return index
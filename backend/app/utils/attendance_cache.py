@@ -0,0 +1,97 @@
+import threading
+from app import models
+from app.config import ATTENDANCE_CACHE_AUTHORITATIVE
+from app.utils.time_utils import local_today, day_bounds, to_local_date
+
+# -------------------------------------------------------------------
+# ✅ "Already marked today" cache
+# -------------------------------------------------------------------
+# A per-day set of user ids with attendance. Warmed from the DB at
+# startup, rolled over lazily on the first access after local midnight,
+# and updated by crud on every insert/delete, so duplicate checks on
+# the hot path do not touch the database.
+
+
+class MarkedTodayCache:
+    def __init__(self, authoritative=ATTENDANCE_CACHE_AUTHORITATIVE):
+        self._lock = threading.Lock()
+        self.authoritative = authoritative
+        self._day = None
+        self._marked = set()
+
+    def warm(self, db):
+        """Loads today's marked user ids with one indexed query."""
+        day = local_today()
+        start, end = day_bounds(day)
+        rows = db.query(models.Attendance.user_id).filter(
+            models.Attendance.timestamp >= start,
+            models.Attendance.timestamp < end,
+        ).distinct().all()
+        with self._lock:
+            self._day = day
+            self._marked = {r[0] for r in rows}
+        print(f"✅ Attendance cache warmed: {len(self._marked)} students marked on {day}")
+
+    def _ensure_today(self, db):
+        if self._day != local_today():
+            self.warm(db)
+
+    def _query_user(self, db, user_id):
+        start, end = day_bounds(self._day)
+        return db.query(models.Attendance.id).filter(
+            models.Attendance.user_id == user_id,
+            models.Attendance.timestamp >= start,
+            models.Attendance.timestamp < end,
+        ).first() is not None
+
+    def is_marked(self, db, user_id):
+        """True if `user_id` already has attendance for the current local day."""
+        self._ensure_today(db)
+        with self._lock:
+            if user_id in self._marked:
+                return True
+        if self.authoritative:
+            return False
+        # Another worker may have marked this student; confirm with the index
+        if self._query_user(db, user_id):
+            self.mark(user_id)
+            return True
+        return False
+
+    def marked_among(self, db, user_ids):
+        """Subset of `user_ids` already marked today."""
+        self._ensure_today(db)
+        user_ids = set(user_ids)
+        with self._lock:
+            found = user_ids & self._marked
+        if self.authoritative or found == user_ids:
+            return found
+        start, end = day_bounds(self._day)
+        rows = db.query(models.Attendance.user_id).filter(
+            models.Attendance.user_id.in_(list(user_ids - found)),
+            models.Attendance.timestamp >= start,
+            models.Attendance.timestamp < end,
+        ).all()
+        extra = {r[0] for r in rows}
+        with self._lock:
+            self._marked |= extra
+        return found | extra
+
+    def mark(self, user_id, timestamp=None):
+        """Called after an insert; ignores rows that belong to another day."""
+        with self._lock:
+            if timestamp is None or to_local_date(timestamp) == self._day:
+                self._marked.add(user_id)
+
+    def unmark(self, db, user_id):
+        """Called after a delete; keeps the id if another record for today remains."""
+        if self._day is None:
+            return
+        still_marked = self._query_user(db, user_id)
+        with self._lock:
+            if not still_marked:
+                self._marked.discard(user_id)
+
+
+# ✅ Shared instance
+attendance_cache = MarkedTodayCache()
@@ -0,0 +1,247 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from sqlalchemy import func
+from app import models
+from app.utils.time_utils import to_local_date, local_today
+
+# -------------------------------------------------------------------
+# 📊 Incrementally maintained attendance summaries
+# -------------------------------------------------------------------
+# attendance_daily_summary   (day, branch, status) → count
+# student_attendance_days    (user_id, day)        → records
+# student_attendance_totals  user_id               → days / records / first / last day
+#
+# crud calls apply_insert / apply_delete inside the same transaction as
+# the Attendance insert or delete, so the summaries commit (or roll
+# back) together with the raw rows. rebuild() recomputes everything from
+# the attendance table (see rebuild_summaries.py).
+# The branch is the student's branch at the time the record was written.
+
+_UPSERT_DIALECTS = ("sqlite", "postgresql")
+
+
+def _dialect_insert(db):
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _add_counts(db, model, key_cols, value_col, counts):
+    """Atomically adds `counts[key]` to `value_col` of each row (inserting missing rows)."""
+    if not counts:
+        return
+    if db.get_bind().dialect.name in _UPSERT_DIALECTS:
+        insert = _dialect_insert(db)
+        rows = [dict(zip(key_cols, key), **{value_col: n}) for key, n in counts.items()]
+        stmt = insert(model)
+        column = getattr(model, value_col)
+        # executemany of one cached statement (batched into multi-row VALUES by the driver layer)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=key_cols,
+            set_={value_col: column + getattr(stmt.excluded, value_col)},
+        ), rows)
+        return
+    # Other databases: read-modify-write inside the caller's transaction
+    for key, n in counts.items():
+        row = db.get(model, key)
+        if row is None:
+            db.add(model(**dict(zip(key_cols, key)), **{value_col: n}))
+        else:
+            setattr(row, value_col, getattr(row, value_col) + n)
+    db.flush()
+
+
+def _subtract_counts(db, model, key_cols, value_col, counts):
+    column = getattr(model, value_col)
+    for key, n in counts.items():
+        match = [getattr(model, col) == value for col, value in zip(key_cols, key)]
+        db.query(model).filter(*match).update({column: column - n}, synchronize_session=False)
+        db.query(model).filter(*match, column <= 0).delete(synchronize_session=False)
+
+
+def _refresh_totals(db, user_ids):
+    """Recomputes the running totals of `user_ids` from their (few) per-day rows."""
+    D, T = models.StudentAttendanceDay, models.StudentAttendanceTotal
+    user_ids = list(user_ids)
+    stats = {
+        r.user_id: r
+        for r in db.query(
+            D.user_id,
+            func.count(D.day).label("days"),
+            func.sum(D.records).label("records"),
+            func.min(D.day).label("first_day"),
+            func.max(D.day).label("last_day"),
+        ).filter(D.user_id.in_(user_ids)).group_by(D.user_id)
+    }
+    totals = {t.user_id: t for t in db.query(T).filter(T.user_id.in_(user_ids))}
+    for user_id in user_ids:
+        total = totals.get(user_id)
+        r = stats.get(user_id)
+        if r is None:
+            if total is not None:
+                db.delete(total)
+            continue
+        if total is None:
+            total = T(user_id=user_id)
+            db.add(total)
+        total.days_present = r.days
+        total.records = int(r.records or 0)
+        total.first_day = r.first_day
+        total.last_day = r.last_day
+
+
+def _aggregate(entries):
+    """entries: (user_id, branch, status, timestamp) → (daily counts, student-day counts)."""
+    daily, student_days = Counter(), Counter()
+    for user_id, branch, status, timestamp in entries:
+        day = to_local_date(timestamp)
+        daily[(day, branch or "—", status or "")] += 1
+        student_days[(user_id, day)] += 1
+    return daily, student_days
+
+
+def _with_branches(db, rows):
+    """(user_id, status, timestamp) → adds each student's current branch."""
+    user_ids = {user_id for user_id, _, _ in rows}
+    branches = dict(db.query(models.User.id, models.User.branch).filter(models.User.id.in_(user_ids)))
+    return [(user_id, branches.get(user_id), status, ts) for user_id, status, ts in rows]
+
+
+# -------------------------------------------------------------------
+# 🔄 Maintenance (called by crud, no commit here)
+# -------------------------------------------------------------------
+def apply_insert(db, rows):
+    """Counts new attendance rows given as (user_id, status, timestamp)."""
+    if not rows:
+        return
+    daily, student_days = _aggregate(_with_branches(db, rows))
+    _add_counts(db, models.AttendanceDailySummary, ["day", "branch", "status"], "count", daily)
+    _add_counts(db, models.StudentAttendanceDay, ["user_id", "day"], "records", student_days)
+    db.flush()
+    _refresh_totals(db, {user_id for user_id, _ in student_days})
+
+
+def apply_delete(db, rows):
+    """Un-counts attendance rows given as (user_id, status, timestamp)."""
+    if not rows:
+        return
+    daily, student_days = _aggregate(_with_branches(db, rows))
+    _subtract_counts(db, models.AttendanceDailySummary, ["day", "branch", "status"], "count", daily)
+    _subtract_counts(db, models.StudentAttendanceDay, ["user_id", "day"], "records", student_days)
+    db.flush()
+    _refresh_totals(db, {user_id for user_id, _ in student_days})
+
+
+def rebuild(db, chunk_size=5000):
+    """Recomputes all summary tables from the attendance table (one transaction)."""
+    query = (
+        db.query(models.Attendance.user_id, models.User.branch, models.Attendance.status, models.Attendance.timestamp)
+        .join(models.User, models.Attendance.user_id == models.User.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    daily, student_days = _aggregate(query)
+
+    db.query(models.StudentAttendanceTotal).delete(synchronize_session=False)
+    db.query(models.StudentAttendanceDay).delete(synchronize_session=False)
+    db.query(models.AttendanceDailySummary).delete(synchronize_session=False)
+    db.bulk_insert_mappings(models.AttendanceDailySummary, [
+        {"day": day, "branch": branch, "status": status, "count": n}
+        for (day, branch, status), n in daily.items()
+    ])
+    db.bulk_insert_mappings(models.StudentAttendanceDay, [
+        {"user_id": user_id, "day": day, "records": n} for (user_id, day), n in student_days.items()
+    ])
+
+    totals = defaultdict(lambda: {"days_present": 0, "records": 0, "first_day": None, "last_day": None})
+    for (user_id, day), n in student_days.items():
+        t = totals[user_id]
+        t["days_present"] += 1
+        t["records"] += n
+        t["first_day"] = min(t["first_day"] or day, day)
+        t["last_day"] = max(t["last_day"] or day, day)
+    db.bulk_insert_mappings(models.StudentAttendanceTotal, [
+        {"user_id": user_id, **t} for user_id, t in totals.items()
+    ])
+    db.commit()
+    print(f"✅ Attendance summaries rebuilt: {len(daily)} day/branch/status rows, "
+          f"{len(student_days)} student-days, {len(totals)} students")
+
+
+def ensure_built(db):
+    """Builds the summaries once for databases that predate them."""
+    has_summary = db.query(models.AttendanceDailySummary.day).first() is not None
+    has_attendance = db.query(models.Attendance.id).first() is not None
+    if has_attendance and not has_summary:
+        rebuild(db)
+
+
+# -------------------------------------------------------------------
+# 📈 Reports (read only the summary tables + users)
+# -------------------------------------------------------------------
+def branch_turnout(db, date_from, date_to, branch=None):
+    """Per-branch, per-day present count, split by status, and % of enrolled students."""
+    S = models.AttendanceDailySummary
+    query = db.query(S.day, S.branch, S.status, S.count).filter(S.day >= date_from, S.day <= date_to)
+    if branch:
+        query = query.filter(S.branch == branch)
+
+    enrolled = dict(db.query(models.User.branch, func.count(models.User.id)).group_by(models.User.branch))
+    days = {}
+    for day, br, status, count in query.order_by(S.day, S.branch):
+        entry = days.setdefault((day, br), {"day": day, "branch": br, "present": 0, "by_status": {}})
+        entry["present"] += count
+        entry["by_status"][status] = count
+    for entry in days.values():
+        total = enrolled.get(entry["branch"], 0)
+        entry["enrolled"] = total
+        entry["turnout_pct"] = round(entry["present"] * 100 / total, 2) if total else None
+    return list(days.values())
+
+
+def student_percentages(db, date_from, date_to, branch=None, roll_no=None):
+    """Per-student days present / class days (days the branch had any attendance) in the range."""
+    S, D, T = models.AttendanceDailySummary, models.StudentAttendanceDay, models.StudentAttendanceTotal
+
+    class_days = dict(
+        db.query(S.branch, func.count(func.distinct(S.day)))
+        .filter(S.day >= date_from, S.day <= date_to)
+        .group_by(S.branch)
+    )
+    present = dict(
+        db.query(D.user_id, func.count(D.day))
+        .filter(D.day >= date_from, D.day <= date_to)
+        .group_by(D.user_id)
+    )
+
+    users = db.query(models.User.id, models.User.full_name, models.User.roll_no, models.User.branch,
+                     T.days_present, T.last_day).outerjoin(T, T.user_id == models.User.id)
+    if branch:
+        users = users.filter(models.User.branch == branch)
+    if roll_no:
+        users = users.filter(models.User.roll_no == roll_no)
+
+    result = []
+    for user_id, name, roll, br, total_days, last_day in users.order_by(models.User.roll_no):
+        days = present.get(user_id, 0)
+        held = class_days.get(br, 0)
+        result.append({
+            "user_id": user_id,
+            "full_name": name,
+            "roll_no": roll,
+            "branch": br,
+            "days_present": days,
+            "class_days": held,
+            "percentage": round(days * 100 / held, 2) if held else None,
+            "total_days_present": total_days or 0,
+            "last_present": last_day,
+        })
+    return result
+
+
+def default_range(date_from=None, date_to=None, days=30):
+    """Fills a missing report range with the last `days` local days."""
+    date_to = date_to or local_today()
+    return date_from or (date_to - timedelta(days=days - 1)), date_to
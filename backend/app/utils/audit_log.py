@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from app import models
+from app.config import AUDIT_LOG_MODE, AUDIT_LOG_BATCH, AUDIT_LOG_FLUSH_MS, AUDIT_LOG_BUFFER
+from app.database import SessionLocal
+from app.utils.metrics import metrics
+
+# -------------------------------------------------------------------
+# 🧾 Write-behind audit logging
+# -------------------------------------------------------------------
+# crud.log_action() only enqueues the event; a background thread writes
+# queued events with one bulk INSERT + commit when AUDIT_LOG_BATCH are
+# waiting or the oldest is AUDIT_LOG_FLUSH_MS old. created_at is taken
+# at enqueue time, so batching does not shift timestamps.
+#
+# The buffer is bounded: when it is full the caller writes its event
+# inline (slower, but nothing is lost). A failed flush is retried after
+# a short pause. flush() / close() drain the queue (shutdown, tests).
+# Mode "sync" keeps the old behaviour: one commit per event.
+#
+# Counters: audit.written, audit.inline, audit.flush_failed, audit.dropped
+# Gauge:    audit.queue_depth
+# Metrics:  audit.batch_size, audit.flush_ms
+
+
+class _Marker:
+    """Queue entry asking the writer to report once everything before it is written."""
+
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class AuditLogger:
+    def __init__(self, mode=AUDIT_LOG_MODE, batch_size=AUDIT_LOG_BATCH, flush_ms=AUDIT_LOG_FLUSH_MS,
+                 max_buffer=AUDIT_LOG_BUFFER, session_factory=SessionLocal):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.interval = flush_ms / 1000.0
+        self.session_factory = session_factory
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+
+    def log(self, action, detail, db=None):
+        event = {"action": action, "detail": detail, "created_at": datetime.now(timezone.utc)}
+        if self.mode == "sync":
+            self._write_now([event], db)
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            metrics.inc("audit.inline")
+            self._write_now([event])
+            return
+        metrics.set_gauge("audit.queue_depth", self._queue.qsize())
+
+    def flush(self, timeout=10):
+        """Blocks until every event queued before this call is written; False on timeout."""
+        if self._thread is None:
+            return True
+        marker = _Marker()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            # Buffer saturated (writer stalled or DB down): don't fail the caller
+            print("⚠️ Audit log flush timed out: buffer is full")
+            return False
+        return marker.done.wait(timeout)
+
+    def close(self, timeout=10):
+        """Writes what is queued and stops the writer thread."""
+        if self._thread is None:
+            return
+        marker = _Marker(stop=True)
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            print(f"⚠️ Audit log closed with {self._queue.qsize()} events unwritten: buffer is full")
+            return
+        marker.done.wait(timeout)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ---------------------------------------------------------------
+    # 💾 Writes
+    # ---------------------------------------------------------------
+    def _write_now(self, events, db=None):
+        own = db is None
+        db = db or self.session_factory()
+        try:
+            db.bulk_insert_mappings(models.AuditLog, events)
+            db.commit()
+            metrics.inc("audit.written", len(events))
+        finally:
+            if own:
+                db.close()
+
+    def _write_batch(self, events):
+        started = time.perf_counter()
+        while True:
+            try:
+                self._write_now(events)
+                break
+            except Exception as e:
+                metrics.inc("audit.flush_failed")
+                print(f"⚠️ Audit log flush failed ({len(events)} events), retrying:", e)
+                if self._queue.full():
+                    metrics.inc("audit.dropped", len(events))
+                    print(f"❌ Audit buffer full, dropped {len(events)} events")
+                    break
+                time.sleep(max(self.interval, 0.5))
+        metrics.observe("audit.batch_size", len(events))
+        metrics.observe("audit.flush_ms", (time.perf_counter() - started) * 1000)
+
+    # ---------------------------------------------------------------
+    # 🔁 Writer loop
+    # ---------------------------------------------------------------
+    def _collect(self):
+        """Next batch of events plus the marker that ended it early (if any)."""
+        first = self._queue.get()
+        if isinstance(first, _Marker):
+            return [], first
+        batch = [first]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if isinstance(item, _Marker):
+                return batch, item
+            batch.append(item)
+        return batch, None
+
+    def _run(self):
+        while True:
+            batch, marker = self._collect()
+            if batch:
+                self._write_batch(batch)
+            metrics.set_gauge("audit.queue_depth", self._queue.qsize())
+            if marker is not None:
+                marker.done.set()
+                if marker.stop:
+                    return
+
+
+# ✅ Shared instance
+audit_log = AuditLogger()
@@ -0,0 +1,82 @@
+import pickle
+import struct
+import numpy as np
+
+# -------------------------------------------------------------------
+# 💾 Compact binary storage for face embeddings
+# -------------------------------------------------------------------
+# Layout of User.face_encoding (8-byte header + raw little-endian float32):
+#
+#   | model tag (2s) | format version (u8) | crop pipeline (u8) | dim (u32) | dim * float32 |
+#
+# The header is exactly two float32 slots wide, so rows of the same
+# size can be concatenated and decoded with one np.frombuffer call.
+#
+# Crop pipeline: which face crop the model was fed. Embeddings are only
+# comparable within one pipeline, so older rows need a re-enrollment.
+#   0  DeepFace's own detector + alignment (enrollments before the shared crop)
+#   1  Haar detection + eye alignment (liveness_utils.align_face_crop), used
+#      by enrollment and every attendance path
+
+HEADER = struct.Struct("<2sBBI")
+FORMAT_VERSION = 1
+MODEL_TAGS = {"Facenet": b"FN"}
+DEFAULT_MODEL = "Facenet"
+LEGACY_PIPELINE = 0
+CROP_PIPELINE = 1
+_HEADER_SLOTS = HEADER.size // 4
+
+_TAG_TO_MODEL = {tag: model for model, tag in MODEL_TAGS.items()}
+
+
+def encode_embedding(embedding, model=DEFAULT_MODEL, pipeline=CROP_PIPELINE):
+    """Serialises an embedding as tagged little-endian float32 bytes."""
+    vec = np.ascontiguousarray(np.asarray(embedding, dtype="<f4").reshape(-1))
+    return HEADER.pack(MODEL_TAGS[model], FORMAT_VERSION, pipeline, vec.shape[0]) + vec.tobytes()
+
+
+def is_binary_embedding(blob):
+    if blob is None or len(blob) < HEADER.size:
+        return False
+    tag, version, _, dim = HEADER.unpack_from(blob)
+    return tag in _TAG_TO_MODEL and version == FORMAT_VERSION and len(blob) == HEADER.size + dim * 4
+
+
+def embedding_model(blob):
+    """Returns the model name stored in the header (None for legacy rows)."""
+    if not is_binary_embedding(blob):
+        return None
+    return _TAG_TO_MODEL[HEADER.unpack_from(blob)[0]]
+
+
+def embedding_pipeline(blob):
+    """Crop pipeline the embedding came from (legacy pickles: LEGACY_PIPELINE)."""
+    if not is_binary_embedding(blob):
+        return LEGACY_PIPELINE
+    return HEADER.unpack_from(blob)[2]
+
+
+def decode_embedding(blob, allow_pickle=True):
+    """Decodes one stored embedding; legacy pickled rows are read until migrated."""
+    if blob is None:
+        return None
+    if is_binary_embedding(blob):
+        return np.frombuffer(blob, dtype="<f4", offset=HEADER.size).astype(np.float32)
+    if allow_pickle:
+        # ⚠️ Old rows written with pickle.dumps — run migrate_embeddings.py
+        return np.asarray(pickle.loads(blob), dtype=np.float32)
+    raise ValueError("Unrecognised face encoding format")
+
+
+def decode_many(blobs):
+    """
+    Decodes many binary embeddings of the same size with a single
+    np.frombuffer over the concatenated bytes. Returns an (n, dim) matrix.
+    """
+    if not blobs:
+        return np.empty((0, 0), dtype=np.float32)
+    row_len = len(blobs[0])
+    if any(len(b) != row_len for b in blobs):
+        raise ValueError("Embeddings have different sizes")
+    flat = np.frombuffer(b"".join(blobs), dtype="<f4")
+    return flat.reshape(len(blobs), row_len // 4)[:, _HEADER_SLOTS:].astype(np.float32)
@@ -0,0 +1,153 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app.config import EMBED_BATCHING, EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH, EMBED_TIMEOUT_S
+from app.utils.face_utils import get_face_embedding, get_face_embeddings_batch
+from app.utils.metrics import metrics
+from app.utils.phash_cache import image_digest, embedding_cache
+from app.utils.worker_pool import stage_slot
+
+# -------------------------------------------------------------------
+# 📦 Cross-request micro-batching for Facenet embeddings
+# -------------------------------------------------------------------
+# Requests from all kiosks are collected for a short window (or until
+# EMBED_MAX_BATCH images are waiting), embedded with one forward pass,
+# and each caller gets its own result back through a Future.
+#
+# Metrics: embedding.batch_size, embedding.queue_wait_ms,
+#          embedding.forward_ms, gauge embedding.queue_depth
+
+
+class _Job:
+    __slots__ = ("image", "aligned", "future", "enqueued_at")
+
+    def __init__(self, image, aligned):
+        self.image = image
+        self.aligned = aligned
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    def __init__(self, window_ms=EMBED_BATCH_WINDOW_MS, max_batch=EMBED_MAX_BATCH):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, image, aligned=False):
+        """Queues one image and returns a Future resolving to its embedding (or None)."""
+        self._ensure_started()
+        job = _Job(image, aligned)
+        self._queue.put(job)
+        metrics.set_gauge("embedding.queue_depth", self._queue.qsize())
+        return job.future
+
+    def embed(self, image, aligned=False, timeout=EMBED_TIMEOUT_S):
+        return self.submit(image, aligned).result(timeout=timeout)
+
+    def embed_many(self, images, aligned=False, timeout=EMBED_TIMEOUT_S):
+        futures = [self.submit(img, aligned) for img in images]
+        return [f.result(timeout=timeout) for f in futures]
+
+    # ---------------------------------------------------------------
+    # 🔁 Worker loop
+    # ---------------------------------------------------------------
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            metrics.set_gauge("embedding.queue_depth", self._queue.qsize())
+            metrics.observe("embedding.batch_size", len(batch))
+            for job in batch:
+                metrics.observe("embedding.queue_wait_ms", (started - job.enqueued_at) * 1000)
+
+            try:
+                results = [None] * len(batch)
+                # Crops and full frames need different preprocessing → one pass each
+                for aligned in (False, True):
+                    idx = [i for i, job in enumerate(batch) if job.aligned == aligned]
+                    if idx:
+                        out = get_face_embeddings_batch([batch[i].image for i in idx], aligned=aligned)
+                        for i, emb in zip(idx, out):
+                            results[i] = emb
+                for job, emb in zip(batch, results):
+                    job.future.set_result(emb)
+            except Exception as e:
+                print("⚠️ Embedding batch failed:", e)
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+            metrics.observe("embedding.forward_ms", (time.perf_counter() - started) * 1000)
+
+
+# ✅ Shared instance
+batcher = EmbeddingBatcher()
+
+
+def embed_face(image, aligned=False):
+    """Embeds one image through the batcher (or directly when batching is disabled)."""
+    if not EMBED_BATCHING:
+        if aligned:
+            return get_face_embeddings_batch([image], aligned=True)[0]
+        return get_face_embedding(image)
+    return batcher.embed(image, aligned)
+
+
+async def embed_face_async(image, aligned=False):
+    """Async variant for route handlers: bounded by the "embedding" stage admission."""
+    return (await embed_faces_async([image], aligned))[0]
+
+
+async def embed_faces_async(images, aligned=False):
+    """Embeds many images (e.g. every face in a group photo), one admission slot per image.
+
+    Aligned face crops go through the result cache first, so an
+    identical resent crop skips the forward pass.
+    """
+    keys = [image_digest(img) for img in images] if aligned else [None] * len(images)
+    results = [embedding_cache.get(k) if k is not None else None for k in keys]
+    todo = [i for i, emb in enumerate(results) if emb is None]
+    if not todo:
+        return results
+
+    pending = [images[i] for i in todo]
+    async with stage_slot("embedding", len(pending)):
+        if not EMBED_BATCHING:
+            if aligned or len(pending) > 1:
+                computed = await asyncio.to_thread(get_face_embeddings_batch, pending, aligned)
+            else:
+                computed = [await asyncio.to_thread(get_face_embedding, pending[0])]
+        else:
+            futures = [asyncio.wrap_future(batcher.submit(img, aligned)) for img in pending]
+            computed = await asyncio.wait_for(asyncio.gather(*futures), EMBED_TIMEOUT_S)
+
+    for i, emb in zip(todo, computed):
+        results[i] = emb
+        if keys[i] is not None:
+            embedding_cache.put(keys[i], emb)
+    return results
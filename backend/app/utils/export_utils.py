@@ -0,0 +1,112 @@
+import csv
+import io
+import zlib
+
+# -------------------------------------------------------------------
+# 📤 Streaming attendance exports (CSV / gzip CSV / Parquet / Arrow)
+# -------------------------------------------------------------------
+# Every writer consumes chunks of rows from crud.iter_attendance_export
+# and yields bytes as soon as a chunk is encoded, so the response starts
+# immediately and memory does not grow with the attendance history.
+# Parquet / Arrow need the optional `pyarrow` package.
+
+
+def csv_chunks(header, chunks, gzip=False):
+    """CSV bytes per chunk of rows (optionally one continuous gzip member)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None  # wbits 31 → gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(header)
+    for rows in chunks:
+        writer.writerows(rows)
+        data = drain()
+        if data:
+            yield data
+    data = drain()
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what pyarrow wrote since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int64()),
+        ("name", pa.string()),
+        ("roll_no", pa.string()),
+        ("branch", pa.string()),
+        ("status", pa.string()),
+        ("confidence", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+    ])
+
+
+def _record_batch(schema, rows):
+    import pyarrow as pa
+    columns = list(zip(*rows))
+    # Timestamps are local wall time; drop tzinfo so the column type is uniform
+    columns[6] = [ts.replace(tzinfo=None) if ts is not None else None for ts in columns[6]]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+    )
+
+
+def columnar_chunks(chunks, fmt="parquet"):
+    """Parquet (one row group per chunk, zstd) or Arrow IPC stream bytes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        write = writer.write_batch
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    for rows in chunks:
+        write(_record_batch(schema, rows))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    data = sink.drain()
+    if data:
+        yield data
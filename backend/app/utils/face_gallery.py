@@ -0,0 +1,295 @@
+import threading
+import numpy as np
+from app.config import (
+    FACE_INDEX_BACKEND,
+    FACE_INDEX_PATH,
+    FACE_INDEX_NLIST,
+    FACE_INDEX_NPROBE,
+    FACE_INDEX_MIN_SIZE,
+)
+from app.utils.ann_index import IVFIndex
+
+# -------------------------------------------------------------------
+# 🧠 In-memory Face Gallery (vectorized recognition)
+# -------------------------------------------------------------------
+# Keeps every enrolled embedding in one contiguous, L2-normalised
+# float32 matrix so a probe is matched with a single matrix-vector
+# product instead of unpickling and comparing users one at a time.
+# With FACE_INDEX_BACKEND="ivf" large galleries are searched through an
+# approximate IVF index instead (see ann_index.py).
+# Each user also belongs to a roster (their branch); a contiguous
+# per-roster slice is cached so session-scoped searches stay small.
+
+
+def l2_normalize(vec):
+    """Returns a float32 copy of `vec` scaled to unit length (rows if 2-D)."""
+    arr = np.asarray(vec, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+def roster_key(branch):
+    """Normalised roster name ("CSE ", "cse" → "cse"); None when not given."""
+    return branch.strip().lower() if branch and branch.strip() else None
+
+
+class FaceGallery:
+    """Process-wide matrix of enrolled faces with a parallel array of user ids."""
+
+    def __init__(self, initial_capacity=256):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._index_building = False
+        self._reset(dim=0)
+
+    def _reset(self, dim):
+        self.dim = dim
+        self._size = 0
+        self._matrix = np.zeros((self._initial_capacity, dim), dtype=np.float32)
+        self._user_ids = np.zeros(self._initial_capacity, dtype=np.int64)
+        self._names = [None] * self._initial_capacity
+        self._row_of = {}
+        self._roster_of = {}
+        self._rosters = {}
+        self._roster_cache = {}
+        self.index = None
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, user_id):
+        return user_id in self._row_of
+
+    @property
+    def matrix(self):
+        """Read-only view of the live rows (do not keep across updates)."""
+        return self._matrix[:self._size]
+
+    @property
+    def user_ids(self):
+        return self._user_ids[:self._size]
+
+    # ---------------------------------------------------------------
+    # 🔄 Build / update
+    # ---------------------------------------------------------------
+    def load(self, rows):
+        """Rebuilds the gallery from an iterable of (user_id, full_name, embedding[, branch])."""
+        rows = [tuple(r) + (None,) * (4 - len(r)) for r in rows if r[2] is not None]
+        if not rows:
+            self.load_arrays(np.empty(0, dtype=np.int64), [], np.empty((0, self.dim), dtype=np.float32))
+            return
+        self.load_arrays(
+            np.array([r[0] for r in rows], dtype=np.int64),
+            [r[1] for r in rows],
+            np.stack([r[2] for r in rows]),
+            [r[3] for r in rows],
+        )
+
+    def load_arrays(self, user_ids, names, matrix, branches=None):
+        """Rebuilds the gallery from parallel arrays (as returned by crud.load_encoding_matrix)."""
+        with self._lock:
+            n = len(user_ids)
+            dim = matrix.shape[1] if n else self.dim
+            self._initial_capacity = max(self._initial_capacity, n)
+            self._reset(dim)
+            if not n:
+                return
+            self._matrix[:n] = l2_normalize(matrix)
+            self._user_ids[:n] = user_ids
+            self._names[:n] = names
+            self._row_of = {int(uid): row for row, uid in enumerate(user_ids)}
+            self._size = n
+            for uid, branch in zip(user_ids, branches or []):
+                self._set_roster(int(uid), branch)
+
+    def _set_roster(self, user_id, branch):
+        old = self._roster_of.pop(user_id, None)
+        if old is not None:
+            self._rosters[old].discard(user_id)
+            self._roster_cache.pop(old, None)
+        key = roster_key(branch)
+        if key is not None:
+            self._roster_of[user_id] = key
+            self._rosters.setdefault(key, set()).add(user_id)
+            self._roster_cache.pop(key, None)
+
+    def _roster_slice(self, key):
+        """Contiguous (user_ids, names, matrix) copy for one roster, rebuilt after changes."""
+        cached = self._roster_cache.get(key)
+        if cached is None:
+            rows = np.array(sorted(self._row_of[uid] for uid in self._rosters.get(key, ())), dtype=np.int64)
+            cached = (
+                self._user_ids[rows].copy(),
+                [self._names[r] for r in rows],
+                np.ascontiguousarray(self._matrix[rows]),
+            )
+            self._roster_cache[key] = cached
+        return cached
+
+    def load_from_db(self, db):
+        """Loads every stored face encoding (called once at startup)."""
+        from app import crud
+        self.load_arrays(*crud.load_encoding_matrix(db))
+        print(f"🧠 Face gallery loaded: {self._size} enrolled faces")
+        if FACE_INDEX_BACKEND == "ivf" and self._size >= FACE_INDEX_MIN_SIZE:
+            self.build_index()
+
+    # ---------------------------------------------------------------
+    # 🗂️ Optional ANN index
+    # ---------------------------------------------------------------
+    def build_index(self, force_retrain=False):
+        """Loads the saved IVF quantiser (or trains a new one) and assigns all rows."""
+        try:
+            with self._lock:
+                if self._size == 0:
+                    return
+                vectors = self.matrix.copy()
+                dim = self.dim
+
+            index = None if force_retrain else IVFIndex.load(FACE_INDEX_PATH, dim)
+            if index is not None and FACE_INDEX_NLIST and index.nlist != FACE_INDEX_NLIST:
+                index = None
+            if index is None or index.needs_retrain(len(vectors)):
+                index = IVFIndex(dim, nlist=FACE_INDEX_NLIST, nprobe=FACE_INDEX_NPROBE)
+                index.train(vectors)
+                index.save(FACE_INDEX_PATH)
+                print(f"🗂️ Trained IVF face index: nlist={index.nlist}")
+            index.nprobe = FACE_INDEX_NPROBE
+
+            with self._lock:
+                # Rows may have changed while training; assign the current snapshot
+                index.build(self.user_ids, self.matrix)
+                self.index = index
+        finally:
+            # Also on failure, so the next growth step can try again
+            self._index_building = False
+
+    def _maybe_build_index_async(self):
+        """Starts a background (re)build once the gallery outgrows the current index."""
+        if FACE_INDEX_BACKEND != "ivf" or self._index_building or self._size < FACE_INDEX_MIN_SIZE:
+            return
+        if self.index is not None and not self.index.needs_retrain(self._size):
+            return
+        self._index_building = True
+        retrain = self.index is not None
+        threading.Thread(target=self.build_index, args=(retrain,), daemon=True).start()
+
+    def _grow(self):
+        capacity = max(1, len(self._user_ids) * 2)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        user_ids[:self._size] = self._user_ids[:self._size]
+        self._matrix, self._user_ids = matrix, user_ids
+        self._names.extend([None] * (capacity - len(self._names)))
+
+    def add(self, user_id, full_name, embedding, branch=None):
+        """Inserts or replaces one user's embedding in place."""
+        vec = l2_normalize(embedding).reshape(-1)
+        with self._lock:
+            if self._size == 0 and self.dim != vec.shape[0]:
+                self._reset(vec.shape[0])
+            if vec.shape[0] != self.dim:
+                raise ValueError(f"Embedding size {vec.shape[0]} does not match gallery size {self.dim}")
+
+            row = self._row_of.get(user_id)
+            if row is None:
+                if self._size == len(self._user_ids):
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._row_of[user_id] = row
+            self._matrix[row] = vec
+            self._user_ids[row] = user_id
+            self._names[row] = full_name
+            self._set_roster(user_id, branch)
+            if self.index is not None:
+                self.index.add(user_id, vec)
+            self._maybe_build_index_async()
+
+    def remove(self, user_id):
+        """Drops a user by moving the last row into its slot (O(1))."""
+        with self._lock:
+            row = self._row_of.pop(user_id, None)
+            if row is None:
+                return False
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._user_ids[row] = self._user_ids[last]
+                self._names[row] = self._names[last]
+                self._row_of[int(self._user_ids[row])] = row
+            self._names[last] = None
+            self._size = last
+            self._set_roster(user_id, None)
+            if self.index is not None:
+                self.index.remove(user_id)
+            return True
+
+    # ---------------------------------------------------------------
+    # 🔍 Search
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _top_k(sims, user_ids, names, k):
+        k = min(k, len(sims))
+        if k < len(sims):
+            top = np.argpartition(-sims, k - 1)[:k]
+        else:
+            top = np.arange(len(sims))
+        top = top[np.argsort(-sims[top])]
+        return [(int(user_ids[i]), names[i], float(sims[i])) for i in top]
+
+    def search(self, embedding, k=1, roster=None):
+        """
+        Returns up to `k` (user_id, full_name, similarity) sorted best first.
+        With `roster` (a branch), only that roster's slice is searched.
+        """
+        probe = l2_normalize(embedding).reshape(-1)
+        with self._lock:
+            if self._size == 0 or probe.shape[0] != self.dim:
+                return []
+            key = roster_key(roster)
+            if key is not None:
+                if not self._rosters.get(key):
+                    return []
+                user_ids, names, matrix = self._roster_slice(key)
+                return self._top_k(matrix @ probe, user_ids, names, k)
+            if self.index is not None and self._size >= FACE_INDEX_MIN_SIZE:
+                return [
+                    (uid, self._names[self._row_of[uid]], sim)
+                    for uid, sim in self.index.search(probe, k)
+                ]
+            return self._top_k(self._matrix[:self._size] @ probe, self._user_ids, self._names, k)
+
+    def search_many(self, embeddings, roster=None):
+        """
+        Best match for many probes at once (group photos): one matrix-matrix
+        product. Returns [(user_id, full_name, similarity) or None, ...].
+        """
+        probes = l2_normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        with self._lock:
+            if self._size == 0 or len(probes) == 0 or probes.shape[1] != self.dim:
+                return [None] * len(probes)
+            key = roster_key(roster)
+            if key is not None:
+                if not self._rosters.get(key):
+                    return [None] * len(probes)
+                user_ids, names, matrix = self._roster_slice(key)
+            elif self.index is not None and self._size >= FACE_INDEX_MIN_SIZE:
+                results = []
+                for probe in probes:
+                    top = self.search(probe, k=1)
+                    results.append(top[0] if top else None)
+                return results
+            else:
+                user_ids, names, matrix = self._user_ids, self._names, self._matrix[:self._size]
+            sims = matrix @ probes.T
+            best = np.argmax(sims, axis=0)
+            return [
+                (int(user_ids[row]), names[row], float(sims[row, col]))
+                for col, row in enumerate(best)
+            ]
+
+# ✅ Shared instance used by the routes
+gallery = FaceGallery()
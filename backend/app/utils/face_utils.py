@@ -9,20 +9,32 @@ import cv2
 # ✅ EXISTING FUNCTIONS
 # -------------------------------------------------------------
 
-def b64_to_image(b64str: str):
+def b64_to_image(b64str: str, max_side=None):
     """Convert base64-encoded image string to NumPy array."""
     header, data = (b64str.split(",", 1) if "," in b64str else (None, b64str))
     img_bytes = base64.b64decode(data)
-    img = Image.open(BytesIO(img_bytes)).convert("RGB")
-    return np.array(img)
+    return bytes_to_image(img_bytes, max_side)
 
-def get_face_embedding(img_np):
+def bytes_to_image(img_bytes: bytes, max_side=None):
+    """
+    Decode raw image bytes (JPEG/PNG upload) straight to an RGB NumPy array.
+    With `max_side`, JPEGs are downscaled while decoding (DCT draft mode) and
+    anything still larger is shrunk before the full-size array is built.
+    """
+    img = Image.open(BytesIO(img_bytes))
+    if max_side:
+        img.draft("RGB", (max_side, max_side))
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side))
+    return np.array(img.convert("RGB"))
+
+def get_face_embedding(img_np, aligned=False):
     """Extract face embedding using DeepFace with OpenCV backend (no TensorFlow)."""
     try:
         result = DeepFace.represent(
             img_path=img_np,
             model_name="Facenet",
-            detector_backend="opencv",  # avoids tf-keras dependency
+            detector_backend="skip" if aligned else "opencv",  # avoids tf-keras dependency
             enforce_detection=False
         )
         if not result:
@@ -32,6 +44,68 @@ def get_face_embedding(img_np):
         print("⚠️ Face embedding error:", e)
         return None
 
+# -------------------------------------------------------------
+# 📦 Batched embeddings (one forward pass for many faces)
+# -------------------------------------------------------------
+_facenet_model = None
+
+def _get_facenet_model():
+    global _facenet_model
+    if _facenet_model is None:
+        _facenet_model = DeepFace.build_model("Facenet")
+    return _facenet_model
+
+def _prepare_face(face, target_size):
+    """Resizes a face (float 0..1, channels in the order of the input frame) to the model input."""
+    try:
+        from deepface.modules import preprocessing
+        return preprocessing.resize_image(face, target_size)[0]
+    except ImportError:
+        return cv2.resize(face, (target_size[1], target_size[0]))
+
+def get_face_embeddings_batch(images, aligned=False):
+    """
+    Embeds many images with a single Facenet forward pass.
+    `aligned=True` means the images are already face crops (no detection).
+    Returns a list with one float32 embedding (or None) per image.
+    """
+    if not images:
+        return []
+    try:
+        model = _get_facenet_model()
+        target_size = model.input_shape
+        faces, owners = [], []
+        for i, img in enumerate(images):
+            if img is None:
+                continue
+            if aligned:
+                face = img.astype(np.float32) / 255.0 if img.dtype == np.uint8 else img
+            else:
+                detected = DeepFace.extract_faces(
+                    img_path=img,
+                    detector_backend="opencv",
+                    enforce_detection=False,
+                    align=True,
+                )
+                if not detected:
+                    continue
+                # extract_faces swaps the channels; DeepFace.represent swaps them back,
+                # so the model sees the frame's own order (the crops above already are)
+                face = detected[0]["face"][:, :, ::-1]
+            faces.append(_prepare_face(face, target_size))
+            owners.append(i)
+
+        results = [None] * len(images)
+        if faces:
+            output = model.model(np.stack(faces), training=False).numpy()
+            for i, emb in zip(owners, output):
+                results[i] = np.asarray(emb, dtype=np.float32)
+        return results
+    except Exception as e:
+        # Fall back to one DeepFace.represent call per image
+        print("⚠️ Batched embedding failed, using single-image path:", e)
+        return [get_face_embedding(img, aligned) if img is not None else None for img in images]
+
 def cosine_similarity(a, b):
     return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
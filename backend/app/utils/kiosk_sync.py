@@ -0,0 +1,189 @@
+import hashlib
+import hmac
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app import models
+from app.config import SYNC_MAX_EVENT_AGE_DAYS, SYNC_MAX_CLOCK_SKEW_S
+from app.utils import attendance_summary
+from app.utils.attendance_cache import attendance_cache
+from app.utils.metrics import metrics
+from app.utils.time_utils import LOCAL_TZ, now_local, to_local_date, day_bounds
+
+# -------------------------------------------------------------------
+# 🔄 Bulk ingest of buffered kiosk events
+# -------------------------------------------------------------------
+# Offline kiosks queue attendance events and sync them in batches. Each
+# event is signed with the kiosk's secret (KIOSK_SECRETS):
+#
+#   signature = hex(HMAC-SHA256(secret,
+#       "kiosk_id|event_id|user_id|roll_no|method|timestamp|confidence"))
+#
+# with empty strings for missing fields, `timestamp` exactly as sent and
+# confidence formatted with 4 decimals. A whole batch costs a fixed
+# number of queries: receipts, students, existing marks for the batch's
+# days, one executemany INSERT for the new rows, and one commit.
+#
+# The signature is checked before anything else, so an unsigned probe
+# learns nothing about stored receipts and a forged event cannot claim
+# an event_id ahead of the genuine one. (kiosk_id, event_id) receipts
+# make retries idempotent: a replayed event is reported as "replayed"
+# with its first outcome in `original_result`, and never inserts twice.
+#
+# Per-event results: marked, already_marked, replayed, duplicate_in_batch,
+# invalid_signature, invalid_timestamp, invalid_method, unknown_student
+
+METHOD_STATUS = {"face": "present_via_face", "id": "present_via_id", "qr": "present_via_qr"}
+
+
+def signing_message(kiosk_id, event):
+    confidence = "" if event.confidence is None else f"{event.confidence:.4f}"
+    fields = (kiosk_id, event.event_id, event.user_id, event.roll_no, event.method, event.timestamp, confidence)
+    return "|".join("" if f is None else str(f) for f in fields).encode("utf-8")
+
+
+def sign_event(secret, kiosk_id, event):
+    """Signature a kiosk attaches to `event` (also used by tests / benchmarks)."""
+    return hmac.new(secret.encode("utf-8"), signing_message(kiosk_id, event), hashlib.sha256).hexdigest()
+
+
+def parse_client_timestamp(raw, now=None):
+    """Kiosk capture time as aware local time, or None if unparseable / out of range."""
+    try:
+        value = datetime.fromisoformat(raw)
+    except (TypeError, ValueError):
+        return None
+    value = value.replace(tzinfo=LOCAL_TZ) if value.tzinfo is None else value.astimezone(LOCAL_TZ)
+    now = now or now_local()
+    if value > now + timedelta(seconds=SYNC_MAX_CLOCK_SKEW_S):
+        return None
+    if value < now - timedelta(days=SYNC_MAX_EVENT_AGE_DAYS):
+        return None
+    return value
+
+
+def _resolve_students(db, events):
+    """event → user_id (or None) with one query for ids and one for roll numbers."""
+    ids = {e.user_id for e in events if e.user_id is not None}
+    rolls = {e.roll_no for e in events if e.user_id is None and e.roll_no}
+    known_ids = set()
+    if ids:
+        known_ids = {uid for (uid,) in db.query(models.User.id).filter(models.User.id.in_(ids))}
+    by_roll = {}
+    if rolls:
+        by_roll = dict(db.query(models.User.roll_no, models.User.id).filter(models.User.roll_no.in_(rolls)))
+    return {
+        id(e): (e.user_id if e.user_id in known_ids else None) if e.user_id is not None else by_roll.get(e.roll_no)
+        for e in events
+    }
+
+
+def _marked_days(db, user_ids, days):
+    """(user_id, local day) pairs that already have attendance, in one range query."""
+    if not user_ids:
+        return set()
+    start, _ = day_bounds(min(days))
+    _, end = day_bounds(max(days))
+    rows = db.query(models.Attendance.user_id, models.Attendance.timestamp).filter(
+        models.Attendance.user_id.in_(user_ids),
+        models.Attendance.timestamp >= start,
+        models.Attendance.timestamp < end,
+    )
+    return {(uid, to_local_date(ts)) for uid, ts in rows}
+
+
+def _ingest_once(db, kiosk_id, secret, events):
+    results = [None] * len(events)
+
+    # 1️⃣ Receipts of events this kiosk already synced (only shown for signed events)
+    event_ids = list({e.event_id for e in events})
+    receipts = {
+        r.event_id: r for r in db.query(models.SyncReceipt).filter(
+            models.SyncReceipt.kiosk_id == kiosk_id, models.SyncReceipt.event_id.in_(event_ids)
+        )
+    }
+
+    # 2️⃣ Signature first, then replay / in-batch duplicate / timestamp / method checks (no DB)
+    now = now_local()
+    seen, pending = set(), []   # pending: (index, event, aware timestamp)
+    for i, e in enumerate(events):
+        if not hmac.compare_digest(sign_event(secret, kiosk_id, e), e.signature.lower()):
+            results[i] = {"event_id": e.event_id, "result": "invalid_signature"}
+            continue
+        if e.event_id in receipts:
+            r = receipts[e.event_id]
+            results[i] = {"event_id": e.event_id, "result": "replayed", "original_result": r.result,
+                          "user_id": r.user_id, "attendance_id": r.attendance_id}
+            continue
+        if e.event_id in seen:
+            results[i] = {"event_id": e.event_id, "result": "duplicate_in_batch"}
+            continue
+        seen.add(e.event_id)
+        if e.method not in METHOD_STATUS:
+            results[i] = {"event_id": e.event_id, "result": "invalid_method"}
+            continue
+        ts = parse_client_timestamp(e.timestamp, now)
+        if ts is None:
+            results[i] = {"event_id": e.event_id, "result": "invalid_timestamp"}
+            continue
+        pending.append((i, e, ts))
+
+    # 3️⃣ Students + once-per-day rule for every (student, day) in the batch
+    user_of = _resolve_students(db, [e for _, e, _ in pending])
+    accepted = []
+    for i, e, ts in pending:
+        uid = user_of[id(e)]
+        if uid is None:
+            results[i] = {"event_id": e.event_id, "result": "unknown_student"}
+        else:
+            accepted.append((i, e, ts, uid))
+    marked = _marked_days(db, {uid for *_, uid in accepted}, {to_local_date(ts) for _, _, ts, _ in accepted})
+
+    new_rows, receipts_out = [], []
+    for i, e, ts, uid in sorted(accepted, key=lambda a: a[2]):   # earliest event of the day wins
+        key = (uid, to_local_date(ts))
+        if key in marked:
+            results[i] = {"event_id": e.event_id, "result": "already_marked", "user_id": uid}
+        else:
+            marked.add(key)
+            results[i] = {"event_id": e.event_id, "result": "marked", "user_id": uid}
+            new_rows.append((i, {"user_id": uid, "status": METHOD_STATUS[e.method],
+                                 "confidence": e.confidence, "timestamp": ts}))
+        receipts_out.append(i)
+
+    # 4️⃣ One executemany INSERT (+ summaries + receipts), one commit
+    if new_rows:
+        stmt = insert(models.Attendance).returning(models.Attendance.id, sort_by_parameter_order=True)
+        ids = db.execute(stmt, [row for _, row in new_rows]).scalars().all()
+        for (i, _), att_id in zip(new_rows, ids):
+            results[i]["attendance_id"] = att_id
+        attendance_summary.apply_insert(db, [(row["user_id"], row["status"], row["timestamp"]) for _, row in new_rows])
+    if receipts_out:
+        db.execute(insert(models.SyncReceipt), [
+            {"kiosk_id": kiosk_id, "event_id": events[i].event_id, "result": results[i]["result"],
+             "user_id": results[i].get("user_id"), "attendance_id": results[i].get("attendance_id")}
+            for i in receipts_out
+        ])
+    db.commit()
+
+    for _, row in new_rows:
+        attendance_cache.mark(row["user_id"], row["timestamp"])
+    return results
+
+
+def ingest_events(db, kiosk_id, secret, events):
+    """Validates, dedupes and stores a batch of kiosk events; per-event results in input order."""
+    try:
+        results = _ingest_once(db, kiosk_id, secret, events)
+    except IntegrityError:
+        # The same events were synced concurrently (receipt PK clash): the retry sees their receipts
+        db.rollback()
+        metrics.inc("sync.retried_batches")
+        results = _ingest_once(db, kiosk_id, secret, events)
+
+    summary = {}
+    for r in results:
+        summary[r["result"]] = summary.get(r["result"], 0) + 1
+    for result, count in summary.items():
+        metrics.inc(f"sync.{result}", count)
+    return {"kiosk_id": kiosk_id, "received": len(events), "summary": summary, "results": results}
@@ -5,6 +5,15 @@ import numpy as np
 face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
 eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
 
+# Precomputed low-light helpers (shared by every call instead of rebuilt per frame)
+_CLAHE = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+_GAMMA = 1.6
+_GAMMA_LUT = np.array([(i / 255.0) ** (1.0 / _GAMMA) * 255 for i in np.arange(256)]).astype("uint8")
+
+# Margin added around the Haar face box for the liveness ROI (texture, depth, glare)
+ROI_MARGIN = 0.25
+
+
 # -------------------------------------------------------------------
 # 🌙 Helper Function: Auto brightness + contrast for low light
 # -------------------------------------------------------------------
@@ -12,111 +21,315 @@ def enhance_brightness(image):
     """Enhances brightness and contrast automatically for low-light frames."""
     lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
     l, a, b = cv2.split(lab)
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-    cl = clahe.apply(l)
+    cl = _CLAHE.apply(l)
     limg = cv2.merge((cl, a, b))
     enhanced = cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
 
     # Gamma correction
-    gamma = 1.6
-    inv_gamma = 1.0 / gamma
-    table = np.array([(i / 255.0) ** inv_gamma * 255 for i in np.arange(256)]).astype("uint8")
-    return cv2.LUT(enhanced, table)
+    return cv2.LUT(enhanced, _GAMMA_LUT)
+
+
+# -------------------------------------------------------------------
+# 🎯 Face detection (run once per request, reused everywhere)
+# -------------------------------------------------------------------
+def detect_face_box(gray):
+    """Returns the largest (x, y, w, h) Haar face box, or None."""
+    # Equalised copy keeps detection working in the same low light enhance_brightness handles
+    faces = face_cascade.detectMultiScale(cv2.equalizeHist(gray), 1.3, 5)
+    if len(faces) == 0:
+        return None
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    return int(x), int(y), int(w), int(h)
+
+
+def expand_box(box, shape, margin=ROI_MARGIN):
+    """Grows a face box by `margin` on every side, clipped to the frame."""
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(shape[1], x + w + dx), min(shape[0], y + h + dy)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def align_face_crop(frame, gray, box):
+    """
+    Crops the face box from `frame` and levels the eyes (like DeepFace's
+    OpenCV detector does) so the crop can go to the embedder as-is.
+    """
+    x, y, w, h = box
+    face = frame[y:y + h, x:x + w]
+    eyes = eye_cascade.detectMultiScale(gray[y:y + h, x:x + w])
+    if len(eyes) >= 2:
+        # Two largest detections, left to right
+        eyes = sorted(sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2], key=lambda e: e[0])
+        (lx, ly, lw, lh), (rx, ry, rw, rh) = eyes
+        left = (lx + lw / 2, ly + lh / 2)
+        right = (rx + rw / 2, ry + rh / 2)
+        angle = np.degrees(np.arctan2(right[1] - left[1], right[0] - left[0]))
+        if abs(angle) > 1.0:
+            matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+            face = cv2.warpAffine(face, matrix, (w, h), borderMode=cv2.BORDER_REPLICATE)
+    return np.ascontiguousarray(face)
+
+
+def extract_face_crop(frame):
+    """Detects the face once and returns the aligned crop (None if no face)."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    box = detect_face_box(gray)
+    if box is None:
+        return None
+    return align_face_crop(frame, gray, box)
+
+
+def extract_all_face_crops(frame, min_face=40):
+    """
+    Group photos: detects every face and returns [(box, aligned_crop), ...].
+    Uses a finer scale step than detect_face_box since faces are small.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    faces = face_cascade.detectMultiScale(
+        cv2.equalizeHist(gray), scaleFactor=1.1, minNeighbors=5, minSize=(min_face, min_face)
+    )
+    results = []
+    for (x, y, w, h) in faces:
+        box = (int(x), int(y), int(w), int(h))
+        results.append((box, align_face_crop(frame, gray, box)))
+    return results
 
 
 # -------------------------------------------------------------------
 # 👁️ Face Liveness Detection (Anti-Spoof + Low-Light Tolerant)
 # -------------------------------------------------------------------
+def analyze_face_frames(frame1, frame2):
+    """
+    Single-detection pipeline: finds the face box once on frame1, runs all
+    liveness metrics on the face ROI only, and returns (is_live, face_crop)
+    where face_crop is the aligned face for the embedder (None if no face).
+    """
+    try:
+        gray1_raw = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
+        box = detect_face_box(gray1_raw)
+        face_crop = align_face_crop(frame1, gray1_raw, box) if box is not None else None
+
+        if box is not None and frame1.shape == frame2.shape:
+            rx, ry, rw, rh = expand_box(box, frame1.shape)
+            roi1 = frame1[ry:ry + rh, rx:rx + rw]
+            roi2 = frame2[ry:ry + rh, rx:rx + rw]
+            face_in_roi = (box[0] - rx, box[1] - ry, box[2], box[3])
+        else:
+            # No face found → fall back to whole-frame metrics
+            roi1, roi2, face_in_roi = frame1, frame2, None
+
+        return _liveness_decision(roi1, roi2, face_in_roi), face_crop
+    except Exception as e:
+        print(f"⚠️ Liveness check error: {e}")
+        return False, None
+
+
 def detect_liveness(frame1, frame2):
     """
     Detects live human faces using motion, depth, texture, and reflection analysis.
     ✅ Works in natural or low light.
     ❌ Rejects mobile or printed images.
     """
-    try:
-        # Auto brightness correction
-        frame1 = enhance_brightness(frame1)
-        frame2 = enhance_brightness(frame2)
+    return analyze_face_frames(frame1, frame2)[0]
 
-        gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
 
-        # 1️⃣ Motion between frames
-        diff = cv2.absdiff(gray1, gray2)
-        motion_score = np.mean(diff)
+def _liveness_decision(frame1, frame2, face_box=None):
+    """Liveness rules on two (ROI) frames; `face_box` is the face inside the ROI if known."""
+    # Auto brightness correction
+    frame1 = enhance_brightness(frame1)
+    frame2 = enhance_brightness(frame2)
 
-        # 2️⃣ Brightness variation
-        brightness_diff = abs(np.mean(gray1) - np.mean(gray2))
+    gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
 
-        # 3️⃣ Sharpness (texture)
-        lap_var = cv2.Laplacian(gray1, cv2.CV_64F).var()
+    # 1️⃣ Motion between frames
+    diff = cv2.absdiff(gray1, gray2)
+    motion_score = np.mean(diff)
 
-        # 4️⃣ Saturation
-        hsv = cv2.cvtColor(frame1, cv2.COLOR_BGR2HSV)
-        saturation = np.mean(hsv[:, :, 1])
+    # 2️⃣ Brightness variation
+    brightness_diff = abs(np.mean(gray1) - np.mean(gray2))
 
-        # 5️⃣ Reflection (white/glare pixels)
-        bright_spots = np.sum(gray1 > 230)
-        reflection_ratio = bright_spots / gray1.size * 100
+    # 3️⃣ Sharpness (texture)
+    lap_var = cv2.Laplacian(gray1, cv2.CV_64F).var()
 
-        # 6️⃣ Depth variation (3D edges)
-        sobelx = cv2.Sobel(gray1, cv2.CV_64F, 1, 0, ksize=3)
-        sobely = cv2.Sobel(gray1, cv2.CV_64F, 0, 1, ksize=3)
-        depth_variation = np.mean(np.sqrt(sobelx**2 + sobely**2))
+    # 4️⃣ Saturation
+    hsv = cv2.cvtColor(frame1, cv2.COLOR_BGR2HSV)
+    saturation = np.mean(hsv[:, :, 1])
 
-        print(
-            f"🧠 Motion={motion_score:.2f}, BrightnessΔ={brightness_diff:.2f}, "
-            f"Sharpness={lap_var:.2f}, Saturation={saturation:.2f}, "
-            f"Reflection={reflection_ratio:.2f}%, Depth={depth_variation:.2f}"
-        )
+    # 5️⃣ Reflection (white/glare pixels)
+    bright_spots = np.sum(gray1 > 230)
+    reflection_ratio = bright_spots / gray1.size * 100
 
-        # 🚫 Smart Anti-Spoof Filters (Balanced for Natural Light)
-        if lap_var < 15:
-            print("⚠️ Low texture — allowing due to low light.")
-            if motion_score < 0.5:
-                return False
+    # 6️⃣ Depth variation (3D edges)
+    sobelx = cv2.Sobel(gray1, cv2.CV_32F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(gray1, cv2.CV_32F, 0, 1, ksize=3)
+    depth_variation = np.mean(cv2.magnitude(sobelx, sobely))
 
-        # 💡 Reflection tolerance: allow up to 8%
-        if reflection_ratio > 8.0:
-            print("❌ Excessive glare — likely mobile or glossy surface.")
-            return False
-        elif reflection_ratio > 4.0:
-            print("⚠️ Mild glare detected — tolerating as natural reflection.")
+    print(
+        f"🧠 Motion={motion_score:.2f}, BrightnessΔ={brightness_diff:.2f}, "
+        f"Sharpness={lap_var:.2f}, Saturation={saturation:.2f}, "
+        f"Reflection={reflection_ratio:.2f}%, Depth={depth_variation:.2f}"
+    )
 
-        if saturation > 130:
-            print("❌ Oversaturated colors — possible phone screen.")
+    # 🚫 Smart Anti-Spoof Filters (Balanced for Natural Light)
+    if lap_var < 15:
+        print("⚠️ Low texture — allowing due to low light.")
+        if motion_score < 0.5:
             return False
 
-        if motion_score < 0.3 and brightness_diff < 0.3:
-            print("⚠️ Minimal movement — please blink or move slightly.")
-            return False
-
-        if depth_variation < 5:
-            print("❌ Very low depth — likely a flat photo.")
-            return False
+    # 💡 Reflection tolerance: allow up to 8%
+    if reflection_ratio > 8.0:
+        print("❌ Excessive glare — likely mobile or glossy surface.")
+        return False
+    elif reflection_ratio > 4.0:
+        print("⚠️ Mild glare detected — tolerating as natural reflection.")
 
-        # ✅ Optional: Detect eyes for blink/liveness
-        faces = face_cascade.detectMultiScale(gray1, 1.3, 5)
-        if len(faces) > 0:
-            for (x, y, w, h) in faces:
-                roi_gray = gray1[y:y + h, x:x + w]
-                eyes = eye_cascade.detectMultiScale(roi_gray)
-                if len(eyes) >= 1:
-                    print("✅ Eyes detected — real human confirmed.")
-                    return True
-
-        # ✅ Backup validation (strong motion + depth)
-        if motion_score > 2.0 and depth_variation > 8:
-            print("✅ Liveness confirmed by motion + 3D depth.")
-            return True
+    if saturation > 130:
+        print("❌ Oversaturated colors — possible phone screen.")
+        return False
 
-        print("❌ Liveness check failed — spoof or still image.")
+    if motion_score < 0.3 and brightness_diff < 0.3:
+        print("⚠️ Minimal movement — please blink or move slightly.")
         return False
 
-    except Exception as e:
-        print(f"⚠️ Liveness check error: {e}")
+    if depth_variation < 5:
+        print("❌ Very low depth — likely a flat photo.")
         return False
 
+    # ✅ Optional: Detect eyes for blink/liveness (inside the already-found face)
+    faces = [face_box] if face_box is not None else face_cascade.detectMultiScale(gray1, 1.3, 5)
+    for (x, y, w, h) in faces:
+        roi_gray = gray1[y:y + h, x:x + w]
+        eyes = eye_cascade.detectMultiScale(roi_gray)
+        if len(eyes) >= 1:
+            print("✅ Eyes detected — real human confirmed.")
+            return True
+
+    # ✅ Backup validation (strong motion + depth)
+    if motion_score > 2.0 and depth_variation > 8:
+        print("✅ Liveness confirmed by motion + 3D depth.")
+        return True
+
+    print("❌ Liveness check failed — spoof or still image.")
+    return False
+
+
+# -------------------------------------------------------------------
+# 📡 Streaming Liveness (incremental, one frame at a time)
+# -------------------------------------------------------------------
+class LivenessStream:
+    """
+    Keeps running motion / brightness / texture / glare / eye statistics over
+    a stream of small frames so a decision can be made as soon as there is
+    enough evidence. Uses the same thresholds as _liveness_decision.
+    """
+
+    def __init__(self, min_frames=3, max_frames=30):
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.frames = 0
+        self.face_frames = 0
+        self.eye_hits = 0
+        self.pairs = 0
+        self.roi_frames = 0
+        self.roi_box = None
+        self._prev_gray = None
+        self._prev_mean = None
+        self._sums = {"motion": 0.0, "brightness": 0.0, "saturation": 0.0, "reflection": 0.0, "depth": 0.0}
+        self.max_motion = 0.0
+        self.best_sharpness = -1.0
+        self.best_crop = None
+        self.best_frame = None
+
+    def _mean(self, key, count):
+        return self._sums[key] / count if count else 0.0
+
+    def update(self, frame):
+        """Adds one frame. Returns "live", "spoof" or None (need more frames)."""
+        self.frames += 1
+        gray_raw = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        box = detect_face_box(gray_raw)
+
+        if box is not None:
+            self.face_frames += 1
+            if self.roi_box is None:
+                self.roi_box = expand_box(box, frame.shape)
+        if self.roi_box is None:
+            return self._decide()
+
+        # Metrics on the (fixed) face ROI so consecutive frames are comparable
+        rx, ry, rw, rh = self.roi_box
+        roi = enhance_brightness(frame[ry:ry + rh, rx:rx + rw])
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        self.roi_frames += 1
+
+        mean = float(np.mean(gray))
+        if self._prev_gray is not None and self._prev_gray.shape == gray.shape:
+            motion = float(np.mean(cv2.absdiff(gray, self._prev_gray)))
+            self._sums["motion"] += motion
+            self._sums["brightness"] += abs(mean - self._prev_mean)
+            self.max_motion = max(self.max_motion, motion)
+            self.pairs += 1
+        self._prev_gray, self._prev_mean = gray, mean
+
+        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+        self._sums["saturation"] += float(np.mean(hsv[:, :, 1]))
+        self._sums["reflection"] += float(np.sum(gray > 230)) / gray.size * 100
+        sobelx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        sobely = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        self._sums["depth"] += float(np.mean(cv2.magnitude(sobelx, sobely)))
+
+        if box is not None:
+            x, y, w, h = box
+            face_gray = cv2.equalizeHist(gray_raw[y:y + h, x:x + w])
+            if len(eye_cascade.detectMultiScale(face_gray)) >= 1:
+                self.eye_hits += 1
+
+            # Keep the sharpest face for recognition
+            sharpness = cv2.Laplacian(gray_raw[y:y + h, x:x + w], cv2.CV_32F).var()
+            if sharpness > self.best_sharpness:
+                self.best_sharpness = float(sharpness)
+                self.best_crop = align_face_crop(frame, gray_raw, box)
+                self.best_frame = frame
+
+        return self._decide()
+
+    def _decide(self):
+        measured = self.pairs
+        if self.face_frames < self.min_frames:
+            return "spoof" if self.frames >= self.max_frames else None
+
+        count = self.roi_frames
+        motion = self._mean("motion", measured)
+        brightness = self._mean("brightness", measured)
+        saturation = self._mean("saturation", count)
+        reflection = self._mean("reflection", count)
+        depth = self._mean("depth", count)
+
+        if reflection > 8.0 or saturation > 130 or depth < 5:
+            return "spoof"
+        moving = motion >= 0.3 or brightness >= 0.3
+        if moving and self.eye_hits >= 1:
+            return "live"
+        if self.max_motion > 2.0 and depth > 8:
+            return "live"
+        return "spoof" if self.frames >= self.max_frames else None
+
+    def summary(self):
+        count, measured = self.roi_frames, self.pairs
+        return {
+            "frames": self.frames,
+            "face_frames": self.face_frames,
+            "eye_hits": self.eye_hits,
+            "motion": round(self._mean("motion", measured), 2),
+            "brightness_delta": round(self._mean("brightness", measured), 2),
+            "saturation": round(self._mean("saturation", count), 2),
+            "reflection": round(self._mean("reflection", count), 2),
+            "depth": round(self._mean("depth", count), 2),
+        }
+
 
 # -------------------------------------------------------------------
 # 🪪 ID Card Verification (Detect real vs digital)
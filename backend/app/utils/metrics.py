@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+import numpy as np
+
+# -------------------------------------------------------------------
+# 📈 Tiny in-process metrics registry
+# -------------------------------------------------------------------
+# Counters, gauges and rolling histograms (last N observations) that the
+# admin side can read through /admin/metrics. No external dependency.
+
+
+class Metrics:
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_gauge(self, name, amount):
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + amount
+
+    def observe(self, name, value):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = {"count": 0, "sum": 0.0, "max": 0.0, "recent": deque(maxlen=self._window)}
+            hist["count"] += 1
+            hist["sum"] += value
+            hist["max"] = max(hist["max"], value)
+            hist["recent"].append(value)
+
+    def snapshot(self):
+        """Returns a JSON-friendly copy of every metric."""
+        with self._lock:
+            histograms = {}
+            for name, hist in self._histograms.items():
+                recent = np.fromiter(hist["recent"], dtype=np.float64)
+                p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if len(recent) else (0.0, 0.0, 0.0)
+                histograms[name] = {
+                    "count": hist["count"],
+                    "mean": round(hist["sum"] / hist["count"], 3) if hist["count"] else 0.0,
+                    "max": round(hist["max"], 3),
+                    "p50": round(float(p50), 3),
+                    "p95": round(float(p95), 3),
+                    "p99": round(float(p99), 3),
+                }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": histograms,
+            }
+
+
+# ✅ Shared registry
+metrics = Metrics()
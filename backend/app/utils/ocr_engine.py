@@ -0,0 +1,144 @@
+import queue
+import re
+import threading
+from PIL import Image
+from app.config import OCR_BACKEND, TESSERACT_CMD, TESSDATA_PREFIX, OCR_ENGINES_PER_PROCESS
+
+# -------------------------------------------------------------------
+# 🔤 Pluggable Tesseract backend
+# -------------------------------------------------------------------
+# pytesseract starts a new tesseract process (and reloads the language
+# model) for every call. The "tesserocr" backend keeps warm
+# TessBaseAPI instances instead, through the C API, so each OCR worker
+# process pays the model load once.
+#
+#   OCR_BACKEND=auto        tesserocr if it imports and loads a model, else pytesseract
+#   OCR_BACKEND=tesserocr   in-process engines (pip install tesserocr)
+#   OCR_BACKEND=pytesseract subprocess per call (old behaviour)
+#
+# Both backends take pytesseract-style arguments, so callers only use
+# image_to_string(image, lang, config).
+
+_PSM_RE = re.compile(r"--psm\s+(\d+)")
+_OEM_RE = re.compile(r"--oem\s+(\d+)")
+_VAR_RE = re.compile(r"-c\s+(\w+)=(\S+)")
+
+
+def _int_option(pattern, config, default):
+    found = pattern.search(config)
+    return int(found.group(1)) if found else default
+
+
+def _to_pil(image):
+    return image if isinstance(image, Image.Image) else Image.fromarray(image)
+
+
+class PytesseractEngine:
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+        self._pytesseract = pytesseract
+        if TESSERACT_CMD:
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+    def image_to_string(self, image, lang="eng", config=""):
+        return self._pytesseract.image_to_string(image, lang=lang, config=config)
+
+    def warm(self):
+        pass
+
+
+class TesserocrEngine:
+    """Pool of long-lived TessBaseAPI handles (one per concurrent caller)."""
+
+    name = "tesserocr"
+
+    def __init__(self, size=OCR_ENGINES_PER_PROCESS):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._size = size
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, lang, oem):
+        key = (lang, oem)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                kwargs = {"lang": lang, "oem": oem}   # OEM.* constants are plain ints
+                if TESSDATA_PREFIX:
+                    kwargs["path"] = TESSDATA_PREFIX
+                # Register only complete pools: an init error must not leave callers waiting on an empty one
+                pool = queue.LifoQueue()
+                for _ in range(self._size):
+                    pool.put(self._tesserocr.PyTessBaseAPI(**kwargs))
+                self._pools[key] = pool
+        return pool
+
+    def image_to_string(self, image, lang="eng", config=""):
+        oem = _int_option(_OEM_RE, config, 3)
+        psm = _int_option(_PSM_RE, config, 3)
+        variables = dict(_VAR_RE.findall(config))
+
+        pool = self._pool(lang, oem)
+        api = pool.get()
+        previous = {name: api.GetVariableAsString(name) for name in variables}
+        try:
+            api.SetPageSegMode(psm)
+            for name, value in variables.items():
+                api.SetVariable(name, value)
+            api.SetImage(_to_pil(image))
+            return api.GetUTF8Text()
+        finally:
+            # Variables persist on the handle; put back what the next caller expects
+            for name, value in previous.items():
+                api.SetVariable(name, value or "")
+            api.Clear()
+            pool.put(api)
+
+    def warm(self, lang="eng", oem=3):
+        self._pool(lang, oem)
+
+
+_BACKENDS = {"pytesseract": PytesseractEngine, "tesserocr": TesserocrEngine}
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _create_engine(backend):
+    if backend == "auto":
+        try:
+            engine = TesserocrEngine()
+            engine.warm()   # loads the language model now: fails on missing tessdata, bad path, ...
+            return engine
+        except Exception as e:
+            print(f"⚠️ tesserocr unavailable ({e}), using pytesseract")
+            return PytesseractEngine()
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown OCR_BACKEND '{backend}' (use auto, tesserocr or pytesseract)")
+    return _BACKENDS[backend]()
+
+
+def get_engine():
+    """The OCR engine of this process (created on first use)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine(OCR_BACKEND)
+                print(f"🔤 OCR backend: {_engine.name}")
+    return _engine
+
+
+def image_to_string(image, lang="eng", config=""):
+    """Drop-in for pytesseract.image_to_string on the configured backend."""
+    return get_engine().image_to_string(image, lang=lang, config=config)
+
+
+def warm_engine():
+    """Worker-process initializer: load the language model before the first scan."""
+    try:
+        get_engine().warm()
+    except Exception as e:
+        print("⚠️ OCR engine warm-up failed:", e)
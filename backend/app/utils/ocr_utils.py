@@ -0,0 +1,162 @@
+import re
+import cv2
+import numpy as np
+from app.config import OCR_MAX_LINES, OCR_DETECT_WIDTH
+from app.utils.face_utils import preprocess_for_ocr_cv2
+from app.utils.ocr_engine import image_to_string
+
+# -------------------------------------------------------------------
+# 🪪 ID Card OCR helpers
+# -------------------------------------------------------------------
+# Top-level functions so they can be shipped to the worker pool.
+
+ROLL_OCR_CONFIG = (
+    r'--oem 3 --psm 7 '
+    r'-c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789abcdefghijklmnopqrstuvwxyz'
+)
+# Stitched line crops: one uniform block of text (psm 6), one line of output per crop
+LINES_OCR_CONFIG = ROLL_OCR_CONFIG.replace("--psm 7", "--psm 6")
+ROLL_RE = re.compile(r"[a-z]{1,3}\d{2,6}[a-z0-9]{0,4}")
+
+# Gradient → Otsu → horizontal closing joins the characters of a line into one blob
+_GRADIENT_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+_LINE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1))
+LINE_HEIGHT = 48  # line crops are rescaled to this height (Tesseract's sweet spot)
+
+
+def binarize_for_ocr(img):
+    """Grayscale → denoise → contrast → adaptive threshold (dark text on light)."""
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    gray = cv2.bilateralFilter(gray, 9, 75, 75)
+    gray = cv2.convertScaleAbs(gray, alpha=2.0, beta=25)
+    gray = cv2.medianBlur(gray, 3)
+    gray = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 11
+    )
+    if np.mean(gray) < 130:
+        gray = cv2.bitwise_not(gray)
+    return gray
+
+
+# -------------------------------------------------------------------
+# 📏 Text-line localisation (OCR only the small line crops)
+# -------------------------------------------------------------------
+def find_text_lines(img_np, max_lines=OCR_MAX_LINES):
+    """Boxes (x0, y0, x1, y1) of likely text lines, top to bottom, at most `max_lines`."""
+    gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+    scale = min(1.0, OCR_DETECT_WIDTH / width)
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, _GRADIENT_KERNEL)
+    _, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    joined = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, _LINE_KERNEL)
+    contours, _ = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        # Text lines are wide, short and about half ink; photos / logos / borders are not
+        if h < 8 or h > gray.shape[0] * 0.2 or w < 2 * h:
+            continue
+        if cv2.countNonZero(bw[y:y + h, x:x + w]) < 0.3 * w * h:
+            continue
+        boxes.append((x, y, w, h))
+
+    boxes = sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)[:max_lines]
+    lines = []
+    for x, y, w, h in sorted(boxes, key=lambda b: b[1]):
+        pad = max(2, h // 4)
+        lines.append((
+            max(0, int((x - pad) / scale)), max(0, int((y - pad) / scale)),
+            min(width, int((x + w + pad) / scale)), min(height, int((y + h + pad) / scale)),
+        ))
+    return lines
+
+
+def crop_text_lines(img_np, max_lines=OCR_MAX_LINES):
+    """Binarised, height-normalised crops of every detected text line."""
+    crops = []
+    for x0, y0, x1, y1 in find_text_lines(img_np, max_lines):
+        crop = img_np[y0:y1, x0:x1]
+        factor = LINE_HEIGHT / crop.shape[0]
+        crop = cv2.resize(crop, None, fx=factor, fy=factor,
+                          interpolation=cv2.INTER_CUBIC if factor > 1 else cv2.INTER_AREA)
+        crops.append(binarize_for_ocr(crop))
+    return crops
+
+
+def stitch_lines(crops, gap=LINE_HEIGHT // 2):
+    """Stacks the line crops on one white page (left-aligned, `gap` px apart)."""
+    width = max(c.shape[1] for c in crops) + 2 * gap
+    height = sum(c.shape[0] + gap for c in crops) + gap
+    page = np.full((height, width), 255, dtype=np.uint8)
+    y = gap
+    for crop in crops:
+        page[y:y + crop.shape[0], gap:gap + crop.shape[1]] = crop
+        y += crop.shape[0] + gap
+    return page
+
+
+def ocr_text_lines(crops):
+    """OCRs all line crops with ONE Tesseract call on the stitched page. Lowercase lines."""
+    if not crops:
+        return []
+    text = image_to_string(stitch_lines(crops), lang="eng", config=LINES_OCR_CONFIG).lower()
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def join_text_lines(texts):
+    """Orders OCR'd lines with the best roll-number candidate first.
+
+    Returns (text, detected_roll): the lines joined by newlines and the
+    longest roll-number pattern found (None if no line has one).
+    """
+    lines = [t for t in texts if t]
+    best_roll, best_line = None, None
+    for line in lines:
+        for found in ROLL_RE.findall(line.replace("-", "")):
+            if best_roll is None or len(found) > len(best_roll):
+                best_roll, best_line = found, line
+    if best_line is not None:
+        lines.remove(best_line)
+        lines.insert(0, best_line)
+    return "\n".join(lines), best_roll
+
+
+def roll_roi(img_np):
+    """The band where most cards print the roll number (60–90% of the height)."""
+    height, width = img_np.shape[:2]
+    return img_np[int(height * 0.6):int(height * 0.9), int(width * 0.05):int(width * 0.95)]
+
+
+def extract_id_text(img_np):
+    """Fallback when no text line is found: the roll-number ROI (bottom 30%), then the full card."""
+    roi = roll_roi(img_np)
+
+    for idx, img in enumerate([roi, img_np]):
+        gray = binarize_for_ocr(img)
+        text_try = image_to_string(gray, lang="eng", config=ROLL_OCR_CONFIG).lower().strip()
+        if text_try:
+            print(f"✅ Text found on attempt {idx + 1}: {text_try}")
+            return text_try
+    return ""
+
+
+def scan_id_card(img_np):
+    """One pool task per card → (text, detected_roll, lines_found, used_fallback).
+
+    Normally a single OCR call (stitched lines); the ROI + full-card
+    fallback adds at most two when no line reads.
+    """
+    crops = crop_text_lines(img_np)
+    text, detected_roll = join_text_lines(ocr_text_lines(crops))
+    if text.strip():
+        return text, detected_roll, len(crops), False
+    return extract_id_text(img_np), detected_roll, len(crops), True
+
+
+def read_id_text(img_np):
+    """Full-card OCR used at enrollment."""
+    return image_to_string(preprocess_for_ocr_cv2(img_np), lang="eng")
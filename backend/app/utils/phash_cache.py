@@ -0,0 +1,86 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from app.config import PHASH_CACHE_ENABLED, PHASH_CACHE_SIZE, PHASH_CACHE_TTL_S
+from app.utils.metrics import metrics
+
+# -------------------------------------------------------------------
+# ♻️ Image result cache (resent frames / retried uploads)
+# -------------------------------------------------------------------
+# Students resend the same frame after a rejection or a busy (503)
+# response. Results that only depend on the image content (the OCR text
+# and roll number of a card, the embedding of an aligned face crop) are
+# cached under a digest of the decoded pixels, so a retry skips the
+# expensive stage.
+# Keys are exact on purpose: these results identify a student, and a
+# perceptual near-match cannot tell two cards of the same template (one
+# roll digit apart) or two similar face crops from a re-shot of the same
+# image, so it would hand one student's roll / embedding to another.
+# Liveness / anti-spoof verdicts are never cached: an identical replayed
+# frame must still go through the checks.
+#
+# Counters: cache.<name>.hit, cache.<name>.miss, cache.<name>.evicted
+# Gauge:    cache.<name>.size
+
+
+def image_digest(img):
+    """Exact cache key for a decoded image: BLAKE2b of its shape, dtype and pixels."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.shape}|{img.dtype}".encode("ascii"))
+    h.update(img.tobytes())
+    return h.digest()
+
+
+class ImageResultCache:
+    """Bounded LRU with per-entry TTL, keyed by image_digest()."""
+
+    def __init__(self, name, max_entries=PHASH_CACHE_SIZE, ttl_s=PHASH_CACHE_TTL_S, enabled=PHASH_CACHE_ENABLED):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest → (expires_at, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached value for exactly this image, else None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                metrics.inc(f"cache.{self.name}.evicted")
+                entry = None
+            if entry is None:
+                metrics.inc(f"cache.{self.name}.miss")
+                return None
+            self._entries.move_to_end(key)
+        metrics.inc(f"cache.{self.name}.hit")
+        return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.inc(f"cache.{self.name}.evicted")
+            size = len(self._entries)
+        metrics.set_gauge(f"cache.{self.name}.size", size)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        metrics.set_gauge(f"cache.{self.name}.size", 0)
+
+
+# ✅ Shared caches
+ocr_card_cache = ImageResultCache("ocr_card")     # ID card → (text, roll)
+embedding_cache = ImageResultCache("embedding")   # aligned face crop → embedding
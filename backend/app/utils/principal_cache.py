@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import models
+from app.config import AUTH_CACHE_TTL_S, AUTH_CACHE_SIZE
+from app.utils.metrics import metrics
+
+# -------------------------------------------------------------------
+# 🔐 Verified bearer token → Principal cache
+# -------------------------------------------------------------------
+# A hit skips both the JWT signature check and the user lookup. Entries
+# live for AUTH_CACHE_TTL_S, never past the token's own expiry, and the
+# cache is a bounded LRU. Committed updates / deletes of a User drop that
+# user's entries (ORM events below); other worker processes catch up
+# within the TTL.
+#
+# Counters: auth.cache.hit, auth.cache.miss, auth.cache.evicted, auth.cache.invalidated
+
+# role: "admin" (static admin login, no user row) or "user"
+Principal = namedtuple("Principal", ["subject", "role", "user_id", "full_name", "roll_no", "branch", "expires_at"])
+
+
+class PrincipalCache:
+    def __init__(self, ttl_s=AUTH_CACHE_TTL_S, max_entries=AUTH_CACHE_SIZE):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # token → (valid_until, principal)
+        self._by_user = {}              # user_id → set of tokens
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, token):
+        _, principal = self._entries.pop(token)
+        tokens = self._by_user.get(principal.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[principal.user_id]
+
+    def get(self, token):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] < now:
+                self._drop(token)
+                entry = None
+            if entry is None:
+                metrics.inc("auth.cache.miss")
+                return None
+            self._entries.move_to_end(token)
+        metrics.inc("auth.cache.hit")
+        return entry[1]
+
+    def put(self, token, principal):
+        valid_until = min(time.time() + self.ttl_s, principal.expires_at)
+        with self._lock:
+            if token in self._entries:
+                self._drop(token)
+            self._entries[token] = (valid_until, principal)
+            if principal.user_id is not None:
+                self._by_user.setdefault(principal.user_id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                metrics.inc("auth.cache.evicted")
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            tokens = list(self._by_user.get(user_id, ()))
+            for token in tokens:
+                self._drop(token)
+        if tokens:
+            metrics.inc("auth.cache.invalidated", len(tokens))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+
+# ✅ Shared instance
+principal_cache = PrincipalCache()
+
+
+# -------------------------------------------------------------------
+# 🔄 Invalidation: collect changed users during flush, drop them on commit
+# -------------------------------------------------------------------
+# Dropping only after COMMIT keeps a concurrent request from re-caching
+# the row as it was before the change.
+_CHANGED_KEY = "principal_cache.changed_user_ids"
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _note_user_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop(_CHANGED_KEY, ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop(_CHANGED_KEY, None)
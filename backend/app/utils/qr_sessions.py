@@ -0,0 +1,205 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.exc import IntegrityError
+from app import models
+from app.config import QR_SESSION_STORE, QR_SWEEP_INTERVAL_S, QR_MAX_SESSIONS, QR_MAX_DEVICE_USES
+from app.database import SessionLocal
+from app.utils.metrics import metrics
+
+# -------------------------------------------------------------------
+# 📱 QR session store (active sessions + per-device replay guard)
+# -------------------------------------------------------------------
+# Two interchangeable backends, chosen by QR_SESSION_STORE:
+#   memory  TTL maps inside this process; expiry checked on every read,
+#           a background sweeper purges what nobody reads again, and both
+#           maps are capped (oldest entries evicted first)
+#   db      qr_sessions / qr_device_uses tables in DATABASE_URL, so every
+#           uvicorn worker (and host) sees the same sessions; the replay
+#           guard is one atomic upsert
+#
+# Both store an absolute `expires_at` per entry (O(1) expiry check) and
+# forget a device's scan when the session itself expires.
+#
+# Counters: qr.sessions.swept, qr.devices.swept, qr.replays_blocked
+# Gauges:   qr.sessions.active, qr.devices.tracked (memory store)
+
+
+class Sweeper:
+    """Daemon thread calling `task()` every `interval` seconds (started on first use)."""
+
+    def __init__(self, task, interval, name):
+        self.task = task
+        self.interval = interval
+        self.name = name
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is None and self.interval > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.task()
+            except Exception as e:
+                print(f"⚠️ {self.name} failed:", e)
+
+    def stop(self):
+        self._stop.set()
+
+
+def _drop_expired(entries, now, expiry_of):
+    # Full scan: TTLs differ (static vs rotating sessions, device entries end
+    # with their own session), so insertion order is not expiry order
+    expired = [key for key, value in entries.items() if expiry_of(value) < now]
+    for key in expired:
+        del entries[key]
+    return len(expired)
+
+
+class MemorySessionStore:
+    """Single-process store: OrderedDicts in insertion order (the caps evict oldest first)."""
+
+    def __init__(self, max_sessions=QR_MAX_SESSIONS, max_device_uses=QR_MAX_DEVICE_USES,
+                 sweep_interval=QR_SWEEP_INTERVAL_S):
+        self.max_sessions = max_sessions
+        self.max_device_uses = max_device_uses
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()   # session_id → (expires_at, payload)
+        self._devices = OrderedDict()    # (session_id, device) → expires_at
+        self._sweeper = Sweeper(self.sweep, sweep_interval, "qr-session-sweeper")
+
+    def create(self, session_id, payload, ttl_s):
+        self._sweeper.ensure_started()
+        with self._lock:
+            self._sessions[session_id] = (time.time() + ttl_s, payload)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            metrics.set_gauge("qr.sessions.active", len(self._sessions))
+
+    def get(self, session_id):
+        """Payload of a live session, else None."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def mark_device(self, session_id, device, expires_at):
+        """True the first time `device` scans `session_id`, False on a replay."""
+        key = (session_id, device)
+        now = time.time()
+        with self._lock:
+            seen = self._devices.get(key)
+            if seen is not None and seen >= now:
+                metrics.inc("qr.replays_blocked")
+                return False
+            self._devices[key] = expires_at
+            self._devices.move_to_end(key)
+            while len(self._devices) > self.max_device_uses:
+                self._devices.popitem(last=False)
+            metrics.set_gauge("qr.devices.tracked", len(self._devices))
+        return True
+
+    def sweep(self):
+        """Drops every expired session and device entry."""
+        now = time.time()
+        with self._lock:
+            sessions = _drop_expired(self._sessions, now, lambda entry: entry[0])
+            devices = _drop_expired(self._devices, now, lambda expires_at: expires_at)
+            metrics.set_gauge("qr.sessions.active", len(self._sessions))
+            metrics.set_gauge("qr.devices.tracked", len(self._devices))
+        metrics.inc("qr.sessions.swept", sessions)
+        metrics.inc("qr.devices.swept", devices)
+        return [sessions, devices]
+
+    def close(self):
+        self._sweeper.stop()
+
+
+class DBSessionStore:
+    """Shared store in the application database (all workers / hosts)."""
+
+    def __init__(self, session_factory=SessionLocal, sweep_interval=QR_SWEEP_INTERVAL_S):
+        self.session_factory = session_factory
+        self._sweeper = Sweeper(self.sweep, sweep_interval, "qr-session-sweeper")
+
+    def create(self, session_id, payload, ttl_s):
+        self._sweeper.ensure_started()
+        with self.session_factory() as db:
+            db.merge(models.QRSession(session_id=session_id, payload=json.dumps(payload),
+                                      expires_at=time.time() + ttl_s))
+            db.commit()
+
+    def get(self, session_id):
+        with self.session_factory() as db:
+            row = db.get(models.QRSession, session_id)
+            if row is None or row.expires_at < time.time():
+                return None
+            return json.loads(row.payload)
+
+    def mark_device(self, session_id, device, expires_at):
+        """True the first time `device` scans `session_id`, False on a replay."""
+        U = models.QRDeviceUse
+        now = time.time()
+        with self.session_factory() as db:
+            dialect = db.get_bind().dialect.name
+            if dialect in ("sqlite", "postgresql"):
+                if dialect == "postgresql":
+                    from sqlalchemy.dialects.postgresql import insert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert
+                stmt = insert(U).values(session_id=session_id, device=device, expires_at=expires_at)
+                # Inserts, or takes over a stale row; a live row (a replay) matches nothing
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["session_id", "device"],
+                    set_={"expires_at": stmt.excluded.expires_at},
+                    where=U.expires_at < now,
+                )
+                first = db.execute(stmt).rowcount == 1
+                db.commit()
+            else:
+                db.query(U).filter(U.session_id == session_id, U.device == device, U.expires_at < now).delete()
+                db.add(U(session_id=session_id, device=device, expires_at=expires_at))
+                try:
+                    db.commit()
+                    first = True
+                except IntegrityError:
+                    db.rollback()
+                    first = False
+        if not first:
+            metrics.inc("qr.replays_blocked")
+        return first
+
+    def sweep(self):
+        now = time.time()
+        with self.session_factory() as db:
+            sessions = db.query(models.QRSession).filter(models.QRSession.expires_at < now).delete()
+            devices = db.query(models.QRDeviceUse).filter(models.QRDeviceUse.expires_at < now).delete()
+            db.commit()
+        metrics.inc("qr.sessions.swept", sessions)
+        metrics.inc("qr.devices.swept", devices)
+        return [sessions, devices]
+
+    def close(self):
+        self._sweeper.stop()
+
+
+def make_store(kind=QR_SESSION_STORE):
+    if kind == "db":
+        return DBSessionStore()
+    if kind != "memory":
+        print(f"⚠️ Unknown QR_SESSION_STORE '{kind}', using memory")
+    return MemorySessionStore()
+
+
+# ✅ Shared instance
+qr_sessions = make_store()
@@ -1,32 +1,173 @@
-import qrcode
-import jwt
+import base64
+import hashlib
+import hmac
+import io
+import json
+import os
 import time
-from pathlib import Path
-
-SECRET_KEY = "vedika_qr_secret"
-QR_FOLDER = Path("qrs")
-QR_FOLDER.mkdir(exist_ok=True)
-
-def generate_qr_token(session_id: str, subject: str):
-    payload = {
-        "session_id": session_id,
-        "subject": subject,
-        "timestamp": time.time(),
-        "exp": time.time() + 120  # valid for 2 minutes
-    }
-    token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-    return token
-
-def verify_qr_token(token: str):
+from functools import lru_cache
+import qrcode
+import qrcode.image.svg
+from app.config import (
+    QR_TOKEN_SECRET, QR_IMAGE_CACHE_SIZE, QR_WRITE_FILES, QR_FILES_DIR, QR_SESSION_TTL_S, QR_SWEEP_INTERVAL_S,
+    QR_ROTATE_WINDOW,
+)
+from app.utils.qr_sessions import Sweeper
+
+# -------------------------------------------------------------------
+# 🔏 Signed QR tokens + in-memory rendering
+# -------------------------------------------------------------------
+# token = base64url(compact JSON claims) "." base64url(HMAC-SHA256[:16])
+# Claims: s = session id, j = subject, b = branch (optional), e = expiry
+# (epoch seconds). Any worker holding QR_TOKEN_SECRET can verify a token
+# without looking anything up; no JWT header, so the QR stays small.
+#
+# Rotating sessions add r = rotation period. The session token (no `n`)
+# only opens the teacher's SSE stream; the QR shown in class carries
+# n = floor(now / r) and is accepted for the current epoch and the
+# QR_ROTATE_WINDOW before it. Epoch tokens are derived, not stored, so
+# every worker produces and accepts the same ones.
+#
+# Images are rendered from the token on request (PNG or SVG) and kept in
+# a small LRU of bytes. Writing PNGs to QR_FILES_DIR is optional
+# (QR_WRITE_FILES=1); a janitor deletes them once their token expired.
+
+_SIG_BYTES = 16
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(body):
+    return hmac.new(QR_TOKEN_SECRET.encode("utf-8"), body.encode("ascii"), hashlib.sha256).digest()[:_SIG_BYTES]
+
+
+def _encode(claims):
+    body = _b64encode(json.dumps(claims, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    return f"{body}.{_b64encode(_sign(body))}"
+
+
+def _decode(token, now):
+    """Raw claims of a correctly signed, unexpired token, else None."""
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-    except jwt.ExpiredSignatureError:
+        body, sig = token.split(".")
+        if not hmac.compare_digest(_b64decode(sig), _sign(body)):
+            return None
+        claims = json.loads(_b64decode(body))
+    except (AttributeError, ValueError, UnicodeError):
+        return None
+    if claims.get("e", 0) < now:
+        return None
+    return claims
+
+
+def _public(claims):
+    return {"session_id": claims["s"], "subject": claims.get("j"), "branch": claims.get("b"), "exp": claims["e"],
+            "rotate_s": claims.get("r"), "epoch": claims.get("n")}
+
+
+def current_epoch(rotate_s, now=None):
+    return int((now or time.time()) // rotate_s)
+
+
+def generate_qr_token(session_id: str, subject: str, branch=None, ttl_s=QR_SESSION_TTL_S, expires_at=None,
+                      rotate_s=None):
+    """Static QR token, or the session token of a rotating session when `rotate_s` is set."""
+    claims = {"s": session_id, "j": subject, "e": int(expires_at or time.time() + ttl_s)}
+    if branch:
+        claims["b"] = branch
+    if rotate_s:
+        claims["r"] = int(rotate_s)
+    return _encode(claims)
+
+
+def epoch_token(session, epoch):
+    """QR token of a rotating session (claims from verify_session_token) for one epoch."""
+    claims = {"s": session["session_id"], "j": session["subject"], "e": session["exp"]}
+    if session.get("branch"):
+        claims["b"] = session["branch"]
+    claims["r"] = session["rotate_s"]
+    claims["n"] = epoch
+    return _encode(claims)
+
+
+def verify_qr_token(token: str, now=None):
+    """Claims of a token a student may scan (static, or a rotating token inside the window), else None."""
+    now = now or time.time()
+    claims = _decode(token, now)
+    if claims is None:
         return None
-    except jwt.InvalidTokenError:
+    if claims.get("r"):
+        epoch = claims.get("n")
+        current = current_epoch(claims["r"], now)
+        if epoch is None or not current - QR_ROTATE_WINDOW <= epoch <= current:
+            return None
+    return _public(claims)
+
+
+def verify_session_token(token: str, now=None):
+    """Claims of a rotating session's (teacher) token, else None."""
+    claims = _decode(token, now or time.time())
+    if claims is None or not claims.get("r") or "n" in claims:
+        return None
+    return _public(claims)
+
+
+# -------------------------------------------------------------------
+# 🖼️ Rendering
+# -------------------------------------------------------------------
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+@lru_cache(maxsize=QR_IMAGE_CACHE_SIZE)
+def render_qr(token: str, fmt: str = "png") -> bytes:
+    """QR image bytes for `token` (cached per token and format)."""
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        qrcode.make(token, image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qrcode.make(token).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def qr_data_url(token: str, fmt: str = "svg") -> str:
+    """data: URL of the QR image, for pushing frames to a browser <img>."""
+    return f"data:{MEDIA_TYPES[fmt]};base64,{base64.b64encode(render_qr(token, fmt)).decode('ascii')}"
+
+
+def save_qr_file(token: str, session_id: str):
+    """Writes the PNG to QR_FILES_DIR when QR_WRITE_FILES is on (janitor removes it later)."""
+    if not QR_WRITE_FILES:
         return None
+    os.makedirs(QR_FILES_DIR, exist_ok=True)
+    path = os.path.join(QR_FILES_DIR, f"{session_id}.png")
+    with open(path, "wb") as f:
+        f.write(render_qr(token, "png"))
+    _janitor.ensure_started()
+    return path
+
+
+def purge_expired_qr_files(folder=QR_FILES_DIR, ttl_s=QR_SESSION_TTL_S):
+    """Deletes QR images older than the token lifetime; returns how many were removed."""
+    if not os.path.isdir(folder):
+        return 0
+    cutoff = time.time() - ttl_s
+    removed = 0
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.name.endswith(".png") and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass   # another worker's janitor got there first
+    if removed:
+        print(f"🧹 Removed {removed} expired QR images")
+    return removed
+
 
-def create_qr_image(token: str, session_id: str):
-    img = qrcode.make(token)
-    qr_path = QR_FOLDER / f"{session_id}.png"
-    img.save(qr_path)
-    return qr_path
+_janitor = Sweeper(purge_expired_qr_files, QR_SWEEP_INTERVAL_S, "qr-file-janitor")
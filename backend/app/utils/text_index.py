@@ -0,0 +1,205 @@
+import re
+import threading
+from collections import namedtuple
+from difflib import SequenceMatcher
+from app.config import ID_ROLL_FUZZY_MIN, ID_NAME_MATCH_MIN
+
+# -------------------------------------------------------------------
+# 🔎 Roll-number / name lookup for ID-card OCR matching
+# -------------------------------------------------------------------
+# Built once from the users table and kept in sync on enroll/delete, so
+# an ID scan no longer walks every user with SequenceMatcher:
+#   1. exact:  hash of the normalised roll number, probed with every
+#              substring of the OCR text of a known roll length
+#   2. fuzzy:  one-deletion neighbourhood of every roll number, so a scan
+#              with one misread / missing / extra character is found with
+#              a handful of hash lookups, then scored with SequenceMatcher
+#   3. name:   trigram postings of full names → share of the name's
+#              trigrams present in the OCR text
+
+TextMatch = namedtuple("TextMatch", ["user_id", "score", "kind"])
+
+# Ranking between kinds: an exact roll always beats a fuzzy one, which beats a name
+_KIND_RANK = {"roll_exact": 0, "roll_fuzzy": 1, "name": 2}
+
+# OCR misreads folded onto digits, same on both the stored and the scanned side
+_MISREADS = str.maketrans({'o': '0', 'i': '1', 'l': '1', 's': '5', 'b': '8', 'g': '6', 'z': '2', 'q': '9'})
+
+
+def normalize_text(text):
+    """Cleans OCR text: removes symbols, fixes common misreads."""
+    return re.sub(r'[^a-z0-9]', '', (text or "").lower().translate(_MISREADS))
+
+
+def normalize_name(text):
+    """Letters only, lowercase ("Ravi  Kumar." → "ravikumar")."""
+    return re.sub(r'[^a-z]', '', (text or "").lower())
+
+
+def deletions(text):
+    """`text` plus every string obtained by deleting one character."""
+    return {text} | {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+def trigrams(text):
+    """Set of character trigrams (the whole string when shorter than 3)."""
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UserTextIndex:
+    """Process-wide lookup of enrolled roll numbers and names."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._entries = {}          # user_id → (roll_key, name_key)
+        self._by_roll = {}          # roll_key → set(user_id)
+        self._roll_lengths = {}     # len(roll_key) → number of users
+        self._roll_edits = {}       # roll_key or a one-deletion variant → set(user_id)
+        self._name_grams = {}       # trigram → set(user_id)
+        self._name_gram_count = {}  # user_id → number of distinct name trigrams
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    # ---------------------------------------------------------------
+    # 🔄 Build / update
+    # ---------------------------------------------------------------
+    def load(self, rows):
+        """Rebuilds the index from an iterable of (user_id, roll_no, full_name)."""
+        with self._lock:
+            self._reset()
+            for user_id, roll_no, full_name in rows:
+                self._add(user_id, roll_no, full_name)
+        print(f"✅ Text index loaded: {len(self)} roll numbers")
+
+    def load_from_db(self, db):
+        from app import models
+        rows = db.query(models.User.id, models.User.roll_no, models.User.full_name).all()
+        self.load(rows)
+
+    def add(self, user_id, roll_no, full_name):
+        """Adds or replaces one user (called after enrollment)."""
+        with self._lock:
+            self._remove(user_id)
+            self._add(user_id, roll_no, full_name)
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def _add(self, user_id, roll_no, full_name):
+        roll_key = normalize_text(roll_no)
+        name_key = normalize_name(full_name)
+        self._entries[user_id] = (roll_key, name_key)
+        if roll_key:
+            self._by_roll.setdefault(roll_key, set()).add(user_id)
+            self._roll_lengths[len(roll_key)] = self._roll_lengths.get(len(roll_key), 0) + 1
+            for variant in deletions(roll_key):
+                self._roll_edits.setdefault(variant, set()).add(user_id)
+        name_grams = trigrams(name_key)
+        self._name_gram_count[user_id] = len(name_grams)
+        for g in name_grams:
+            self._name_grams.setdefault(g, set()).add(user_id)
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        roll_key, name_key = entry
+        if roll_key:
+            _discard(self._by_roll, roll_key, user_id)
+            self._roll_lengths[len(roll_key)] -= 1
+            if not self._roll_lengths[len(roll_key)]:
+                del self._roll_lengths[len(roll_key)]
+            for variant in deletions(roll_key):
+                _discard(self._roll_edits, variant, user_id)
+        for g in trigrams(name_key):
+            _discard(self._name_grams, g, user_id)
+        self._name_gram_count.pop(user_id, None)
+
+    # ---------------------------------------------------------------
+    # 🔍 Search
+    # ---------------------------------------------------------------
+    def search(self, text, limit=5, roll_min=ID_ROLL_FUZZY_MIN, name_min=ID_NAME_MATCH_MIN):
+        """Ranked TextMatch candidates for raw OCR text (best first)."""
+        clean = normalize_text(text)
+        if not clean:
+            return []
+
+        with self._lock:
+            best = {}
+            for match in self._exact_rolls(clean):
+                _keep_best(best, match)
+            if not best:
+                for match in self._fuzzy_rolls(text, roll_min):
+                    _keep_best(best, match)
+            for match in self._names(text, name_min):
+                _keep_best(best, match)
+
+        ranked = sorted(best.values(), key=lambda m: (_KIND_RANK[m.kind], -m.score))
+        return ranked[:limit]
+
+    def _exact_rolls(self, clean):
+        """Every stored roll number that appears verbatim in the cleaned OCR text."""
+        for length in sorted(self._roll_lengths, reverse=True):
+            if length < 4:
+                continue  # too short to be told apart from random OCR noise
+            for start in range(len(clean) - length + 1):
+                for user_id in self._by_roll.get(clean[start:start + length], ()):
+                    yield TextMatch(user_id, 1.0, "roll_exact")
+
+    def _fuzzy_rolls(self, text, roll_min):
+        """Roll numbers within one edit of an OCR token (misread / dropped character)."""
+        tokens = {normalize_text(t) for t in re.split(r'\s+', text or "")}
+        for token in tokens:
+            if len(token) < 4:
+                continue
+            candidates = set()
+            for variant in deletions(token):
+                candidates |= self._roll_edits.get(variant, set())
+            for uid in candidates:
+                score = SequenceMatcher(None, token, self._entries[uid][0]).ratio()
+                if score >= roll_min:
+                    yield TextMatch(uid, round(score, 3), "roll_fuzzy")
+
+    def _names(self, text, name_min):
+        """Names whose trigrams are mostly present in the OCR text."""
+        shared = _count_postings(self._name_grams, trigrams(normalize_name(text)))
+        for uid, n in shared.items():
+            score = n / max(1, self._name_gram_count[uid])
+            if score >= name_min:
+                yield TextMatch(uid, round(score, 3), "name")
+
+
+def _discard(postings, key, user_id):
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(user_id)
+        if not ids:
+            del postings[key]
+
+
+def _count_postings(postings, grams):
+    counts = {}
+    for g in grams:
+        for uid in postings.get(g, ()):
+            counts[uid] = counts.get(uid, 0) + 1
+    return counts
+
+
+def _keep_best(best, match):
+    current = best.get(match.user_id)
+    if current is None or (_KIND_RANK[match.kind], -match.score) < (_KIND_RANK[current.kind], -current.score):
+        best[match.user_id] = match
+
+
+# ✅ Shared instance
+user_text_index = UserTextIndex()
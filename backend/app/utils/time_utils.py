@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+from app.config import LOCAL_UTC_OFFSET_MINUTES
+
+# -------------------------------------------------------------------
+# 🕒 One definition of "local time" and "today" for the whole app
+# -------------------------------------------------------------------
+# Attendance timestamps are written as timezone-aware local time
+# (IST by default). Day boundaries are built in the same zone, so the
+# once-per-day rule does not depend on the server's own timezone.
+
+LOCAL_TZ = timezone(timedelta(minutes=LOCAL_UTC_OFFSET_MINUTES))
+
+
+def now_local():
+    return datetime.now(LOCAL_TZ)
+
+
+def local_today():
+    return now_local().date()
+
+
+def to_local_date(value):
+    """Local calendar date of a timestamp (naive values are already local wall time)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(LOCAL_TZ)
+    return value.date()
+
+
+def day_bounds(day=None):
+    """[start, end) of a local day as aware datetimes."""
+    day = day or local_today()
+    start = datetime(day.year, day.month, day.day, tzinfo=LOCAL_TZ)
+    return start, start + timedelta(days=1)
@@ -0,0 +1,65 @@
+import asyncio
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from app.config import MAX_UPLOAD_BYTES, MAX_IMAGE_SIDE, MAX_REQUEST_BYTES
+from app.utils.face_utils import bytes_to_image
+
+# -------------------------------------------------------------------
+# 📤 Multipart image uploads (binary JPEG/PNG instead of base64 JSON)
+# -------------------------------------------------------------------
+
+
+class RequestSizeLimitMiddleware:
+    """Rejects request bodies over `max_bytes` with 413, counting bytes as they stream in.
+
+    A declared Content-Length is checked up front; chunked bodies are cut
+    off at the first chunk past the limit, before multipart parsing spools
+    them to disk.
+    """
+
+    def __init__(self, app, max_bytes=MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Request parsing re-raises HTTPException, so this becomes the 413 response
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_image_upload(upload: UploadFile, max_side=MAX_IMAGE_SIDE):
+    """Reads one uploaded image (size-limited) and decodes it to a downscaled RGB array."""
+    if upload is None:
+        raise HTTPException(status_code=400, detail="Missing image upload")
+
+    # The multipart body is already parsed (spooled) here, capped by
+    # RequestSizeLimitMiddleware; this enforces the per-image limit
+    data = await upload.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image '{upload.filename}' is larger than {MAX_UPLOAD_BYTES} bytes")
+    if not data:
+        raise HTTPException(status_code=400, detail=f"Image '{upload.filename}' is empty")
+
+    try:
+        return await asyncio.to_thread(bytes_to_image, data, max_side)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Could not decode image '{upload.filename}'")
@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from app.config import WORKER_POOL_PROCESSES, STAGE_QUEUE_LIMITS, RETRY_AFTER_SECONDS
+from app.utils.metrics import metrics
+from app.utils.ocr_engine import warm_engine
+
+# -------------------------------------------------------------------
+# ⚙️ Bounded worker pool for CPU-heavy stages
+# -------------------------------------------------------------------
+# Liveness, ID anti-spoof and OCR run in a process pool so they never
+# hold FastAPI's threadpool or the GIL. Every stage has a bounded
+# admission counter of tasks in flight (a request fanning out N tasks
+# takes N): once STAGE_QUEUE_LIMITS[stage] would be exceeded, new work
+# fails fast with StageBusyError (→ 503 + Retry-After). A batch larger
+# than the limit is only admitted into an idle stage.
+#
+# Gauges:   pool.<stage>.in_flight
+# Counters: pool.<stage>.admitted, pool.<stage>.rejected
+
+
+class StageBusyError(Exception):
+    """Raised when a stage's admission queue is full."""
+
+    def __init__(self, stage, retry_after=RETRY_AFTER_SECONDS):
+        super().__init__(f"Stage '{stage}' is at capacity")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+_in_flight = {stage: 0 for stage in STAGE_QUEUE_LIMITS}
+_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # "spawn" keeps workers independent of the threads (embedding
+                # batcher, DB pool) already running in the API process.
+                # Each worker loads its OCR engine once, before its first task.
+                _executor = ProcessPoolExecutor(
+                    max_workers=WORKER_POOL_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_engine,
+                )
+    return _executor
+
+
+def _admit(stage, count=1):
+    limit = STAGE_QUEUE_LIMITS.get(stage)
+    with _lock:
+        current = _in_flight.get(stage, 0)
+        if limit is not None and current > 0 and current + count > limit:
+            metrics.inc(f"pool.{stage}.rejected")
+            raise StageBusyError(stage)
+        _in_flight[stage] = current + count
+        metrics.set_gauge(f"pool.{stage}.in_flight", current + count)
+    metrics.inc(f"pool.{stage}.admitted", count)
+
+
+def _release(stage, count=1):
+    with _lock:
+        _in_flight[stage] -= count
+        metrics.set_gauge(f"pool.{stage}.in_flight", _in_flight[stage])
+
+
+@asynccontextmanager
+async def stage_slot(stage, count=1):
+    """Holds `count` admission slots for `stage` (raises StageBusyError when full)."""
+    _admit(stage, count)
+    try:
+        yield
+    finally:
+        _release(stage, count)
+
+
+async def run_in_pool(stage, fn, *args):
+    """Runs a picklable top-level function in the process pool under `stage` admission."""
+    async with stage_slot(stage):
+        future = _get_executor().submit(fn, *args)
+        return await asyncio.wrap_future(future)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,89 @@
+# benchmarks/ann_recall.py
+# Recall-vs-latency report for the IVF face index against exact search.
+#
+#   python -m benchmarks.ann_recall                 # synthetic 100k gallery
+#   python -m benchmarks.ann_recall --size 20000
+#   python -m benchmarks.ann_recall --from-db       # embeddings in attendance.db
+
+import argparse
+import time
+import numpy as np
+
+from app.utils.ann_index import IVFIndex
+from app.utils.face_gallery import l2_normalize
+
+
+def synthetic_gallery(size, dim, spread, seed=0):
+    """Facenet-like clustered embeddings: a few thousand 'look-alike' groups."""
+    rng = np.random.default_rng(seed)
+    groups = l2_normalize(rng.normal(size=(max(1, size // 50), dim)))
+    members = groups[rng.integers(0, len(groups), size)] + (spread / np.sqrt(dim)) * rng.normal(size=(size, dim))
+    return l2_normalize(members)
+
+
+def db_gallery():
+    from app.database import SessionLocal
+    from app import crud
+    db = SessionLocal()
+    try:
+        rows = crud.get_all_user_encodings(db)
+    finally:
+        db.close()
+    return l2_normalize(np.stack([enc for _, _, enc in rows]))
+
+
+def exact_topk(gallery, probes, k):
+    sims = probes @ gallery.T
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def time_per_query(fn, probes):
+    start = time.perf_counter()
+    results = [fn(p) for p in probes]
+    return (time.perf_counter() - start) / len(probes) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF face index recall vs latency")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--spread", type=float, default=0.8, help="within-group noise of synthetic faces")
+    parser.add_argument("--from-db", action="store_true")
+    args = parser.parse_args()
+
+    gallery = db_gallery() if args.from_db else synthetic_gallery(args.size, args.dim, args.spread)
+    rng = np.random.default_rng(1)
+    # Probes are enrolled faces seen again under a new capture (noisy copy)
+    picks = rng.integers(0, len(gallery), args.queries)
+    noise = (0.3 / np.sqrt(gallery.shape[1])) * rng.normal(size=(args.queries, gallery.shape[1]))
+    probes = l2_normalize(gallery[picks] + noise)
+    truth = exact_topk(gallery, probes, 10)
+
+    ids = np.arange(len(gallery))
+    t0 = time.perf_counter()
+    index = IVFIndex(gallery.shape[1], nlist=args.nlist)
+    index.train(gallery)
+    index.build(ids, gallery)
+    build_s = time.perf_counter() - t0
+
+    exact_ms, _ = time_per_query(lambda p: exact_topk(gallery, p[None, :], 10)[0], probes)
+
+    print(f"Gallery: {len(gallery)} x {gallery.shape[1]}  nlist={index.nlist}  build={build_s:.1f}s")
+    print(f"| search        | nprobe | recall@1 | recall@10 | ms/query | speed-up |")
+    print(f"|---------------|--------|----------|-----------|----------|----------|")
+    print(f"| exact (NumPy) |      - |    1.000 |     1.000 | {exact_ms:8.3f} |    1.0x |")
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > index.nlist:
+            break
+        ms, results = time_per_query(lambda p: index.search(p, 10, nprobe=nprobe), probes)
+        r1 = np.mean([bool(res) and res[0][0] == t[0] for res, t in zip(results, truth)])
+        r10 = np.mean([len({uid for uid, _ in res} & set(t)) / 10 for res, t in zip(results, truth)])
+        print(f"| ivf           | {nprobe:6d} | {r1:8.3f} | {r10:9.3f} | {ms:8.3f} | {exact_ms / ms:6.1f}x |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/ocr_latency.py
+# Per-scan OCR latency: pytesseract (process per call) vs tesserocr (warm engine).
+#
+#   python -m benchmarks.ocr_latency               # synthetic ID card
+#   python -m benchmarks.ocr_latency --image card.jpg --scans 50
+#
+# Three scan strategies are compared per backend:
+#   roi+full  the old fixed crop (bottom 30%), then the full card if empty
+#   per line  text-line localisation, one small psm-7 call per line
+#   stitched  the same line crops stacked on one page, ONE psm-6 call (API path)
+#
+# Sample run (synthetic card, 30 scans, 1 vCPU; tesseract 5.5 CLI and
+# tesserocr 2.11 / libtesseract 5.5 with the same eng.traineddata):
+#
+# | backend     | scan     | first scan ms | p50 ms | p95 ms | text |
+# |-------------|----------|---------------|--------|--------|------|
+# | pytesseract | roi+full |         236.6 |  253.0 |  274.4 | '521001' |
+# | pytesseract | per line |         612.7 |  572.9 |  644.5 | 'NAMERAVIKUMAR | BRANCHCSE | CS21001' |
+# | pytesseract | stitched |         232.6 |  233.5 |  277.8 | 'NAMERAVIKUMAR | BRANCHCSE | CS21001' |
+# | tesserocr   | roi+full |         199.1 |   25.0 |   28.3 | '521001' |
+# | tesserocr   | per line |          42.8 |   45.4 |   65.8 | 'NAMERAVIKUMAR | BRANCHCSE | CS21001' |
+# | tesserocr   | stitched |          42.7 |   54.7 |   58.1 | 'NAMERAVIKUMAR | BRANCHCSE | CS21001' |
+#
+# The warm engine pays the model load once (first scan) and then cuts
+# steady-state latency 5-10x. With pytesseract every call is a process
+# spawn, so the API stitches the lines into one call: the line reading
+# at the cost of a single roi+full attempt.
+
+import argparse
+import time
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from app.utils import ocr_engine
+from app.utils.ocr_utils import ROLL_OCR_CONFIG, LINES_OCR_CONFIG, binarize_for_ocr, crop_text_lines, stitch_lines
+
+
+def synthetic_card(width=1720, height=1080):
+    card = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(card)
+    try:
+        font = ImageFont.load_default(size=56)   # scalable font (Pillow >= 10.1)
+    except TypeError:
+        font = ImageFont.load_default()
+    draw.rectangle([0, 0, width, 180], fill=(30, 60, 140))
+    draw.text((60, 300), "NAME: RAVI KUMAR", fill="black", font=font)
+    draw.text((60, 400), "BRANCH: CSE", fill="black", font=font)
+    draw.text((60, 760), "CS21001", fill="black", font=font)
+    return np.array(card)
+
+
+def scan_roi_full(engine, img_np):
+    height, width, _ = img_np.shape
+    roi = img_np[int(height * 0.6):int(height * 0.9), int(width * 0.05):int(width * 0.95)]
+    for img in (roi, img_np):
+        text = engine.image_to_string(binarize_for_ocr(img), lang="eng", config=ROLL_OCR_CONFIG).strip()
+        if text:
+            return text
+    return ""
+
+
+def scan_per_line(engine, img_np):
+    texts = [engine.image_to_string(c, lang="eng", config=ROLL_OCR_CONFIG).strip() for c in crop_text_lines(img_np)]
+    return " | ".join(t for t in texts if t)
+
+
+def scan_stitched(engine, img_np):
+    text = engine.image_to_string(stitch_lines(crop_text_lines(img_np)), lang="eng", config=LINES_OCR_CONFIG)
+    return " | ".join(t.strip() for t in text.splitlines() if t.strip())
+
+
+def bench(engine, scan, img_np, scans):
+    started = time.perf_counter()
+    text = scan(engine, img_np)
+    first_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    for _ in range(scans):
+        started = time.perf_counter()
+        scan(engine, img_np)
+        timings.append((time.perf_counter() - started) * 1000)
+    return text, first_ms, np.percentile(timings, [50, 95])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image", help="ID card photo (default: synthetic card)")
+    parser.add_argument("--scans", type=int, default=30)
+    args = parser.parse_args()
+
+    img_np = np.array(Image.open(args.image).convert("RGB")) if args.image else synthetic_card()
+
+    crops = crop_text_lines(img_np)
+    print(f"lines: {len(crops)} crops, {sum(c.size for c in crops):,} px "
+          f"(full card {img_np.shape[0] * img_np.shape[1]:,} px)\n")
+
+    print("| backend     | scan     | first scan ms | p50 ms | p95 ms | text |")
+    print("|-------------|----------|---------------|--------|--------|------|")
+    for name, cls in (("pytesseract", ocr_engine.PytesseractEngine), ("tesserocr", ocr_engine.TesserocrEngine)):
+        try:
+            engine = cls()
+        except Exception as e:
+            print(f"| {name:<11} | unavailable: {e} |")
+            continue
+        for label, scan in (("roi+full", scan_roi_full), ("per line", scan_per_line), ("stitched", scan_stitched)):
+            try:
+                text, first_ms, (p50, p95) = bench(engine, scan, img_np, args.scans)
+            except Exception as e:
+                print(f"| {name:<11} | {label:<8} | failed: {e} |")
+                continue
+            print(f"| {name:<11} | {label:<8} | {first_ms:13.1f} | {p50:6.1f} | {p95:6.1f} | {text!r} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# migrate_embeddings.py
+# Converts pickled face encodings in users.face_encoding to the compact
+# tagged float32 format (see app/utils/embedding_codec.py).
+#
+#   python migrate_embeddings.py            # convert in place
+#   python migrate_embeddings.py --dry-run  # only report what would change
+#   python migrate_embeddings.py --list-stale
+#                                           # students to re-enroll: their encoding
+#                                           # comes from an older face crop pipeline
+import sys
+from app.database import SessionLocal
+from app import models
+from app.utils.embedding_codec import (
+    encode_embedding, decode_embedding, is_binary_embedding, embedding_pipeline, LEGACY_PIPELINE, CROP_PIPELINE,
+)
+
+BATCH_SIZE = 500
+
+
+def migrate(dry_run=False):
+    db = SessionLocal()
+    converted = already_binary = failed = 0
+    try:
+        rows = (
+            db.query(models.User.id, models.User.face_encoding)
+            .filter(models.User.face_encoding.isnot(None))
+            .all()
+        )
+        pending = []
+        for user_id, blob in rows:
+            if is_binary_embedding(blob):
+                already_binary += 1
+                continue
+            try:
+                # Pickles predate the shared face crop, so they keep the legacy pipeline tag
+                vec = decode_embedding(blob)
+                pending.append({"id": user_id, "face_encoding": encode_embedding(vec, pipeline=LEGACY_PIPELINE)})
+            except Exception as e:
+                failed += 1
+                print(f"⚠️ User {user_id}: could not decode encoding ({e})")
+                continue
+
+            if len(pending) >= BATCH_SIZE:
+                converted += _flush(db, pending, dry_run)
+        converted += _flush(db, pending, dry_run)
+    finally:
+        db.close()
+
+    verb = "Would convert" if dry_run else "Converted"
+    print(f"✅ {verb} {converted} encodings ({already_binary} already binary, {failed} failed)")
+
+
+def list_stale():
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(models.User.id, models.User.roll_no, models.User.full_name, models.User.face_encoding)
+            .filter(models.User.face_encoding.isnot(None))
+            .order_by(models.User.roll_no)
+            .all()
+        )
+    finally:
+        db.close()
+    stale = [row for row in rows if embedding_pipeline(row[3]) != CROP_PIPELINE]
+    for user_id, roll_no, full_name, _ in stale:
+        print(f"{user_id}\t{roll_no}\t{full_name}")
+    print(f"🔁 {len(stale)} of {len(rows)} students need a new face enrollment "
+          f"(POST /users/reenroll_face/{{user_id}} as admin)")
+
+
+def _flush(db, pending, dry_run):
+    count = len(pending)
+    if count and not dry_run:
+        db.bulk_update_mappings(models.User, pending)
+        db.commit()
+    pending.clear()
+    return count
+
+
+if __name__ == "__main__":
+    if "--list-stale" in sys.argv:
+        list_stale()
+    else:
+        print("🧩 Migrating face encodings in attendance.db ...")
+        migrate(dry_run="--dry-run" in sys.argv)
@@ -0,0 +1,19 @@
+# rebuild_summaries.py
+# Recomputes the attendance summary tables (daily per branch/status,
+# per-student days and totals) from the raw attendance rows.
+# Run after bulk edits made outside the API, or to fix drift.
+#
+#   python rebuild_summaries.py
+from app.database import Base, SessionLocal, engine
+from app import models
+from app.utils import attendance_summary
+
+
+if __name__ == "__main__":
+    print("🧩 Rebuilding attendance summaries in attendance.db ...")
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        attendance_summary.rebuild(db)
+    finally:
+        db.close()